@@ -79,12 +79,12 @@ class IterativeKGBuilder:
         
         # List S3 objects
         response = self.s3_client.list_objects_v2(Bucket=bucket_name)
-        pdf_files = [obj['Key'] for obj in response.get('Contents', []) 
+        pdf_files = [(obj['Key'], obj['Size']) for obj in response.get('Contents', []) 
                     if obj['Key'].lower().endswith('.pdf')]
         
         all_documents = []
         
-        for pdf_key in pdf_files[:5]:  # Limit to 5 PDFs initially
+        for pdf_key, pdf_size in pdf_files[:5]:  # Limit to 5 PDFs initially
             try:
                 logger.info(f"Processing {pdf_key}...")
                 
@@ -94,7 +94,7 @@ class IterativeKGBuilder:
                     self.s3_client.download_file(bucket_name, pdf_key, tmp_file.name)
                     
                     # Extract content
-                    doc = parser.extract_from_pdf(Path(tmp_file.name))
+                    doc = parser.extract_from_pdf(Path(tmp_file.name), known_size=pdf_size)
                     doc.metadata['s3_key'] = pdf_key
                     all_documents.append(doc)
                     
@@ -120,7 +120,7 @@ class IterativeKGBuilder:
         all_relationships = []
         
         for doc in documents:
-            for idx, table in enumerate(doc.tables):
+            for idx, table in enumerate(doc.tables_as_df):
                 try:
                     # Convert table to string
                     table_text = table.to_string()
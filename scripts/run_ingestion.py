@@ -12,13 +12,14 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 import logging
-import json
+import orjson
 from dotenv import load_dotenv
 import boto3
+from botocore.config import Config
 from neo4j import GraphDatabase
 from openai import OpenAI
 
-from src.ingestion.pdf_parser import S3DocumentIngester
+from src.ingestion.pdf_parser import S3DocumentIngester, CamelotWorkerPool
 from src.ingestion.knowledge_extractor import KnowledgeExtractor, DocumentProcessor
 from src.ingestion.graph_loader import GraphSchemaManager, Neo4jBulkLoader, CSVExporter
 
@@ -43,7 +44,9 @@ def main():
         's3',
         aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
         aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-        region_name=os.getenv('AWS_REGION', 'us-east-1')
+        region_name=os.getenv('AWS_REGION', 'us-east-1'),
+        # One connection per concurrent ranged GET across all PDF download workers
+        config=Config(max_pool_connections=S3DocumentIngester.pool_size())
     )
     
     # OpenAI client
@@ -52,47 +55,47 @@ def main():
     # Neo4j driver
     neo4j_driver = GraphDatabase.driver(
         os.getenv('NEO4J_URI'),
-        auth=(os.getenv('NEO4J_USER'), os.getenv('NEO4J_PASSWORD'))
+        auth=(os.getenv('NEO4J_USER'), os.getenv('NEO4J_PASSWORD')),
+        connection_timeout=30
     )
     
     try:
         # Step 1: Extract documents from S3
         logger.info("Step 1: Extracting documents from S3...")
-        ingester = S3DocumentIngester(
-            s3_client=s3_client,
-            bucket_name=os.getenv('AWS_BUCKET_NAME')
-        )
+        data_dir = Path(__file__).parent.parent / "data"
+        
+        # Created before the download threads start, and shut down once extraction is done
+        with CamelotWorkerPool() as camelot_pool:
+            ingester = S3DocumentIngester(
+                s3_client=s3_client,
+                bucket_name=os.getenv('AWS_BUCKET_NAME'),
+                cache_dir=data_dir / "pdf_cache",
+                camelot_pool=camelot_pool
+            )
+            
+            extracted_docs = ingester.ingest_all_documents()
         
-        extracted_docs = ingester.ingest_all_documents()
         logger.info(f"Extracted {len(extracted_docs)} documents")
         
         # Save extracted documents
-        data_dir = Path(__file__).parent.parent / "data"
         raw_dir = data_dir / "raw"
         processed_dir = data_dir / "processed"
         
-        ingester.save_extracted_documents(extracted_docs, raw_dir)
+        ingester.save_extracted_documents(extracted_docs, raw_dir / "extracted_documents.ndjson")
         
         # Step 2: Extract knowledge using LLM
         logger.info("Step 2: Extracting knowledge using LLM...")
-        extractor = KnowledgeExtractor(openai_client)
+        extractor = KnowledgeExtractor(openai_client, cache_dir=data_dir / "llm_cache")
         processor = DocumentProcessor(extractor)
         
-        knowledge_data = []
-        for i, doc in enumerate(extracted_docs):
-            logger.info(f"Processing document {i+1}/{len(extracted_docs)}: {doc.filename}")
-            
-            # Convert to dict for processing
-            doc_dict = doc.to_dict()
-            
-            # Extract knowledge
-            knowledge = processor.process_document(doc_dict)
-            knowledge_data.append(knowledge)
-            
+        logger.info(f"Processing {len(extracted_docs)} documents")
+        knowledge_data = processor.process_documents([doc.to_dict() for doc in extracted_docs])
+        
+        for doc, knowledge in zip(extracted_docs, knowledge_data):
             # Save processed knowledge
             output_file = processed_dir / f"{doc.filename}_knowledge.json"
-            with open(output_file, 'w') as f:
-                json.dump(knowledge, f, indent=2)
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(knowledge, option=orjson.OPT_INDENT_2))
         
         # Step 3: Create graph schema
         logger.info("Step 3: Creating graph schema...")
@@ -92,7 +92,7 @@ class SimpleKGBuilder:
         # List S3 objects
         try:
             response = self.s3_client.list_objects_v2(Bucket=bucket_name)
-            pdf_files = [obj['Key'] for obj in response.get('Contents', []) 
+            pdf_files = [(obj['Key'], obj['Size']) for obj in response.get('Contents', []) 
                         if obj['Key'].lower().endswith('.pdf')]
         except Exception as e:
             logger.error(f"Error listing S3 objects: {e}")
@@ -100,7 +100,7 @@ class SimpleKGBuilder:
         
         all_documents = []
         
-        for pdf_key in pdf_files[:3]:  # Process 3 PDFs at a time
+        for pdf_key, pdf_size in pdf_files[:3]:  # Process 3 PDFs at a time
             try:
                 logger.info(f"Processing {pdf_key}...")
                 
@@ -110,7 +110,7 @@ class SimpleKGBuilder:
                     self.s3_client.download_file(bucket_name, pdf_key, tmp_file.name)
                     
                     # Extract content
-                    doc = parser.extract_from_pdf(Path(tmp_file.name))
+                    doc = parser.extract_from_pdf(Path(tmp_file.name), known_size=pdf_size)
                     doc.metadata['s3_key'] = pdf_key
                     all_documents.append(doc)
                     
@@ -139,8 +139,9 @@ class SimpleKGBuilder:
             # Limit tables per document to control API usage
             tables_to_process = min(len(doc.tables), 5)
             
+            tables = doc.tables_as_df
             for idx in range(tables_to_process):
-                table = doc.tables[idx]
+                table = tables[idx]
                 try:
                     # Convert table to string
                     table_text = table.to_string()
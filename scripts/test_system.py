@@ -113,6 +113,29 @@ def test_core_modules():
         print(f"❌ Core modules error: {str(e)}")
         return False
 
+def test_chunking():
+    """Test that document chunking advances by close to a full window"""
+    print("\nTesting document chunking...")
+    try:
+        from src.ingestion.knowledge_extractor import DocumentProcessor
+        
+        chunk_size, overlap = 2000, 200
+        # Page markers put paragraph breaks near the start of most windows
+        page = "Simplex 4100ES fire alarm control panel. " * 50
+        text = "".join(f"\n--- Page {n} ---\n{page}\n\n" for n in range(1, 21))
+        
+        chunks = DocumentProcessor(None)._split_text_into_chunks(text, chunk_size, overlap)
+        expected = len(text) / (chunk_size - overlap)
+        if not expected <= len(chunks) <= 2 * expected + 1:
+            print(f"❌ Chunking: {len(chunks)} chunks for {len(text)} characters (expected ~{expected:.0f})")
+            return False
+        
+        print(f"✅ Chunking: {len(chunks)} chunks for {len(text)} characters (expected ~{expected:.0f})")
+        return True
+    except Exception as e:
+        print(f"❌ Chunking error: {str(e)}")
+        return False
+
 def main():
     """Run all tests"""
     print("=" * 50)
@@ -123,7 +146,8 @@ def main():
         "Neo4j": test_neo4j(),
         "OpenAI": test_openai(),
         "S3": test_s3(),
-        "Core Modules": test_core_modules()
+        "Core Modules": test_core_modules(),
+        "Chunking": test_chunking()
     }
     
     print("\n" + "=" * 50)
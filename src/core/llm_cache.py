@@ -129,6 +129,9 @@ class LLMCache:
             'max_tokens': params.get('max_tokens', 1000),
             'top_p': params.get('top_p', 1.0)
         }
+        # Structured-output schemas shape the response, so a schema change must not reuse old entries
+        if params.get('response_format') is not None:
+            cache_input['response_format'] = params['response_format']
         
         cache_string = json.dumps(cache_input, sort_keys=True)
         return hashlib.sha256(cache_string.encode()).hexdigest()
@@ -4,15 +4,90 @@ Handles creation of graph schema and loading extracted knowledge
 """
 
 import csv
+import functools
+import gzip
+import hashlib
 import json
 import logging
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-from neo4j import GraphDatabase
-import pandas as pd
+from typing import Dict, List, Any, Optional, Callable, Iterable, Tuple
+from neo4j.exceptions import ClientError, TransientError
 
 logger = logging.getLogger(__name__)
 
+# Labels and match keys that may be interpolated into Cypher
+NODE_LABELS = frozenset({
+    "Product", "License", "Panel", "Module", "Feature",
+    "Detector", "Base", "Annunciator", "PowerSupply",
+    "Battery", "Circuit", "Accessory", "Specification"
+})
+MATCH_KEYS = frozenset({"sku", "license_sku", "name"})
+# Relationship types are interpolated into Cypher when APOC is unavailable
+REL_TYPE_RE = re.compile(r'^[A-Z][A-Z0-9_]*$')
+
+# Property each label is keyed on; labels not listed are keyed on name
+SKU_LABELS = frozenset({
+    "Product", "Panel", "Module", "Detector", "Base",
+    "Annunciator", "PowerSupply", "Battery", "Accessory"
+})
+LABEL_KEY = {label: "sku" for label in SKU_LABELS}
+LABEL_KEY["License"] = "license_sku"
+
+def match_key(label: str, props: Dict[str, Any]) -> Tuple[str, Any]:
+    """Return the (key, value) used to match a node, falling back to name when the key is empty"""
+    key = LABEL_KEY.get(label, "name")
+    value = props.get(key)
+    if not value:
+        return "name", props.get("name", "")
+    return key, value
+
+# Unique constraints per label
+SCHEMA_CONSTRAINTS = {
+    "Product": ["sku"],
+    "License": ["license_sku"],
+    "Panel": ["sku"],
+    "Module": ["sku"],
+    "Feature": ["name"],
+    "Detector": ["sku"],
+    "Base": ["sku"],
+    "Annunciator": ["sku"],
+    "PowerSupply": ["sku"],
+    "Battery": ["sku"],
+    "Accessory": ["sku"]
+}
+
+# Property indexes per label; every label has a name index since
+# relationship MATCHes fall back to name for nodes without a SKU
+SCHEMA_INDEXES = {
+    "Product": ["name", "type"],
+    "License": ["name"],
+    "Panel": ["name", "device_capacity"],
+    "Module": ["name", "type"],
+    "Detector": ["name", "type"],
+    "Base": ["name", "type"],
+    "Annunciator": ["name"],
+    "PowerSupply": ["name"],
+    "Battery": ["name"],
+    "Accessory": ["name"],
+    "Circuit": ["name", "type"],
+    "Specification": ["name", "type"]
+}
+
+# Token lookup indexes for label and relationship-type scans in traversals
+SCHEMA_LOOKUP_INDEXES = (
+    "CREATE LOOKUP INDEX node_label_lookup IF NOT EXISTS FOR (n) ON EACH labels(n)",
+    "CREATE LOOKUP INDEX rel_type_lookup IF NOT EXISTS FOR ()-[r]-() ON EACH type(r)"
+)
+
+@functools.lru_cache(maxsize=4096)
+def truncate_source_text(text: str, limit: int = 500) -> str:
+    """Truncate source text, sharing one string across entities from the same chunk"""
+    return text[:limit]
+
 class GraphSchemaManager:
     """
     Manages Neo4j graph schema and constraints
@@ -25,48 +100,47 @@ class GraphSchemaManager:
     def create_schema(self):
         """Create graph schema with constraints and indexes"""
         
-        constraints = [
-            # Unique constraints for existing entities
-            "CREATE CONSTRAINT product_sku IF NOT EXISTS FOR (p:Product) REQUIRE p.sku IS UNIQUE",
-            "CREATE CONSTRAINT license_sku IF NOT EXISTS FOR (l:License) REQUIRE l.license_sku IS UNIQUE",
-            "CREATE CONSTRAINT panel_sku IF NOT EXISTS FOR (p:Panel) REQUIRE p.sku IS UNIQUE",
-            
-            # Unique constraints for new fire alarm entities
-            "CREATE CONSTRAINT module_sku IF NOT EXISTS FOR (m:Module) REQUIRE m.sku IS UNIQUE",
-            "CREATE CONSTRAINT feature_name IF NOT EXISTS FOR (f:Feature) REQUIRE f.name IS UNIQUE",
-            "CREATE CONSTRAINT detector_sku IF NOT EXISTS FOR (d:Detector) REQUIRE d.sku IS UNIQUE",
-            "CREATE CONSTRAINT base_sku IF NOT EXISTS FOR (b:Base) REQUIRE b.sku IS UNIQUE",
-            "CREATE CONSTRAINT annunciator_sku IF NOT EXISTS FOR (a:Annunciator) REQUIRE a.sku IS UNIQUE",
-            "CREATE CONSTRAINT powersupply_sku IF NOT EXISTS FOR (ps:PowerSupply) REQUIRE ps.sku IS UNIQUE",
-            "CREATE CONSTRAINT battery_sku IF NOT EXISTS FOR (bt:Battery) REQUIRE bt.sku IS UNIQUE",
-            "CREATE CONSTRAINT accessory_sku IF NOT EXISTS FOR (ac:Accessory) REQUIRE ac.sku IS UNIQUE",
-            
-            # Indexes for performance on existing entities
-            "CREATE INDEX product_name IF NOT EXISTS FOR (p:Product) ON (p.name)",
-            "CREATE INDEX product_type IF NOT EXISTS FOR (p:Product) ON (p.type)",
-            "CREATE INDEX license_name IF NOT EXISTS FOR (l:License) ON (l.name)",
-            "CREATE INDEX panel_capacity IF NOT EXISTS FOR (p:Panel) ON (p.device_capacity)",
+        with self.driver.session() as session:
+            try:
+                # Apply the whole schema in one round-trip, keeping any existing indexes
+                session.run(
+                    "CALL apoc.schema.assert($indexes, $constraints, false)",
+                    indexes=SCHEMA_INDEXES,
+                    constraints=SCHEMA_CONSTRAINTS
+                ).consume()
+                self.logger.info("Asserted graph schema with apoc.schema.assert")
+            except Exception as e:
+                self.logger.warning(f"apoc.schema.assert failed, creating schema one statement at a time: {e}")
+                self._run_schema_statements(session, self._schema_statements())
             
-            # Indexes for new fire alarm entities
-            "CREATE INDEX module_name IF NOT EXISTS FOR (m:Module) ON (m.name)",
-            "CREATE INDEX module_type IF NOT EXISTS FOR (m:Module) ON (m.type)",
-            "CREATE INDEX detector_name IF NOT EXISTS FOR (d:Detector) ON (d.name)",
-            "CREATE INDEX detector_type IF NOT EXISTS FOR (d:Detector) ON (d.type)",
-            "CREATE INDEX base_name IF NOT EXISTS FOR (b:Base) ON (b.name)",
-            "CREATE INDEX base_type IF NOT EXISTS FOR (b:Base) ON (b.type)",
-            "CREATE INDEX circuit_name IF NOT EXISTS FOR (c:Circuit) ON (c.name)",
-            "CREATE INDEX circuit_type IF NOT EXISTS FOR (c:Circuit) ON (c.type)",
-            "CREATE INDEX specification_name IF NOT EXISTS FOR (s:Specification) ON (s.name)",
-            "CREATE INDEX specification_type IF NOT EXISTS FOR (s:Specification) ON (s.type)"
-        ]
+            self._run_schema_statements(session, SCHEMA_LOOKUP_INDEXES)
+    
+    def _schema_statements(self) -> List[str]:
+        """Raw Cypher equivalent of SCHEMA_CONSTRAINTS and SCHEMA_INDEXES, for servers without APOC"""
         
-        with self.driver.session() as session:
-            for constraint in constraints:
-                try:
-                    session.run(constraint)
-                    self.logger.info(f"Created constraint/index: {constraint[:50]}...")
-                except Exception as e:
-                    self.logger.warning(f"Constraint might already exist: {e}")
+        def schema_name(label: str, prop: str) -> str:
+            return prop if prop.startswith(label.lower()) else f"{label.lower()}_{prop}"
+        
+        statements = [
+            f"CREATE CONSTRAINT {schema_name(label, prop)} IF NOT EXISTS FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+            for label, props in SCHEMA_CONSTRAINTS.items()
+            for prop in props
+        ]
+        statements.extend(
+            f"CREATE INDEX {schema_name(label, prop)} IF NOT EXISTS FOR (n:{label}) ON (n.{prop})"
+            for label, props in SCHEMA_INDEXES.items()
+            for prop in props
+        )
+        return statements
+    
+    def _run_schema_statements(self, session, statements: Iterable[str]):
+        """Run schema statements one by one, tolerating ones that already exist"""
+        for statement in statements:
+            try:
+                session.run(statement)
+                self.logger.info(f"Created constraint/index: {statement[:50]}...")
+            except Exception as e:
+                self.logger.warning(f"Constraint might already exist: {e}")
     
     def clear_graph(self):
         """Clear all nodes and relationships from the graph"""
@@ -77,26 +151,92 @@ class GraphSchemaManager:
 class Neo4jBulkLoader:
     """
     Handles bulk loading of data into Neo4j
+    
+    Label and relationship-type groups are written concurrently, each worker
+    using its own session from the driver's (thread-safe) connection pool.
     """
     
-    def __init__(self, driver):
+    def __init__(self, driver, max_workers: int = 8, max_retries: int = 3, transaction_size: int = 1000):
         self.driver = driver
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.transaction_size = transaction_size
+        self._server_version = None
+        self._has_apoc = None
         self.logger = logging.getLogger(self.__class__.__name__)
     
+    def _session(self):
+        """Open a write session that skips result paging, and notification metadata where supported"""
+        # Notification filtering needs Neo4j 5.7+; older servers reject the setting outright
+        if self._get_server_version() >= (5, 7):
+            return self.driver.session(notifications_min_severity='OFF', fetch_size=-1)
+        return self.driver.session(fetch_size=-1)
+    
+    def _get_server_version(self) -> Tuple[int, int]:
+        """The server's (major, minor) version, read once from the driver"""
+        if self._server_version is None:
+            try:
+                agent = self.driver.get_server_info().agent  # e.g. "Neo4j/5.14.0"
+                major, minor = agent.split('/')[1].split('.')[:2]
+                self._server_version = (int(major), int(minor))
+            except Exception as e:
+                self.logger.warning(f"Could not determine Neo4j server version, assuming 4.x: {e}")
+                self._server_version = (4, 0)
+        return self._server_version
+    
+    def _apoc_available(self) -> bool:
+        """Whether APOC is installed; without it, nodes and relationships are merged with plain Cypher"""
+        if self._has_apoc is None:
+            try:
+                with self._session() as session:
+                    session.run("RETURN apoc.version()").consume()
+                self._has_apoc = True
+            except ClientError as e:
+                self.logger.warning(f"APOC is not available, loading with plain MERGE statements: {e}")
+                self._has_apoc = False
+        return self._has_apoc
+    
+    def _supports_call_in_transactions(self) -> bool:
+        """Whether the server supports CALL { ... } IN TRANSACTIONS (Neo4j 5+)"""
+        return self._get_server_version() >= (5, 0)
+    
+    def _run_with_retry(self, fn: Callable, *args):
+        """Run a batch write, retrying on transient errors such as deadlocks"""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                return fn(*args)
+            except TransientError as e:
+                if attempt == self.max_retries:
+                    raise
+                self.logger.warning(f"Transient error on attempt {attempt}/{self.max_retries}, retrying: {e}")
+                time.sleep(0.1 * 2 ** attempt)
+    
+    def _run_parallel(self, fn: Callable, groups: Iterable[Tuple[str, List[Dict[str, Any]]]]):
+        """Dispatch (key, group) batches to a thread pool and wait for all of them"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._run_with_retry, fn, key, group): key
+                for key, group in groups
+            }
+            
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.logger.error(f"Failed to load {futures[future]} batch: {e}")
+                    raise
+    
     def load_entities(self, entities: List[Dict[str, Any]]):
         """Load entities into Neo4j using batch operations"""
         
         # Group entities by label
-        entities_by_label = {}
+        entities_by_label = defaultdict(list)
         for entity in entities:
             label = entity['label']
-            if label not in entities_by_label:
-                entities_by_label[label] = []
             entities_by_label[label].append(entity)
         
-        # Load each group
-        for label, entity_group in entities_by_label.items():
-            self._load_entity_batch(label, entity_group)
+        # Load label groups concurrently; distinct labels never contend for the same nodes
+        self._run_parallel(self._load_entity_batch, entities_by_label.items())
     
     def _load_entity_batch(self, label: str, entities: List[Dict[str, Any]]):
         """Load a batch of entities with the same label"""
@@ -104,65 +244,115 @@ class Neo4jBulkLoader:
         if not entities:
             return
         
-        # Prepare batch data
+        # Prepare batch data with the merge key resolved per row
         batch_data = []
         for entity in entities:
-            props = entity['properties'].copy()
-            props['_source_text'] = entity.get('source_text', '')[:500]  # Limit text length
-            batch_data.append(props)
-        
-        # Create Cypher query based on label
-        if label == "Product":
-            query = f"""
-            UNWIND $batch AS props
-            MERGE (n:{label} {{sku: props.sku}})
-            SET n += props
-            """
-        elif label == "License":
-            query = f"""
-            UNWIND $batch AS props
-            MERGE (n:{label} {{license_sku: props.license_sku}})
-            SET n += props
-            """
+            # A fresh row dict; callers' entity properties are exported after loading and must stay untouched
+            props = {**entity['properties'], '_source_text': truncate_source_text(entity.get('source_text') or '')}
+            props.pop('_hash', None)
+            key, value = match_key(label, props)
+            if not value:
+                self.logger.warning(f"Skipping {label} entity without an identifier")
+                continue
+            # Checksum lets re-ingests skip nodes whose properties have not changed
+            props['_hash'] = hashlib.blake2b(
+                json.dumps(props, sort_keys=True, default=str).encode(), digest_size=16
+            ).hexdigest()
+            batch_data.append({'_label': label, '_idProps': {key: value}, '_props': props})
+        
+        # New nodes get all properties on create; existing ones are only written when changed
+        update = """
+        WITH node, row
+        WHERE node._hash IS NULL OR node._hash <> row._props._hash
+        SET node += row._props
+        RETURN count(*)
+        """
+        
+        if self._apoc_available():
+            # A single parameterized query serves every label, so its plan stays cached
+            queries = [("""
+            UNWIND $batch AS row
+            CALL apoc.merge.node([row._label], row._idProps, row._props, {}) YIELD node
+            """ + update, batch_data)]
         else:
-            # Use SKU if available, otherwise fall back to name
-            query = f"""
-            UNWIND $batch AS props
-            CALL {{
-                WITH props
-                WHERE props.sku IS NOT NULL AND props.sku <> ''
-                MERGE (n:{label} {{sku: props.sku}})
-                SET n += props
-            }}
-            CALL {{
-                WITH props
-                WHERE props.sku IS NULL OR props.sku = ''
-                MERGE (n:{label} {{name: props.name}})
-                SET n += props
-            }}
-            """
+            if label not in NODE_LABELS:
+                self.logger.warning(f"Skipping {len(batch_data)} entities with unknown label {label}")
+                return
+            # Plain MERGE needs a static label and key, so rows are split by their match key
+            rows_by_key = defaultdict(list)
+            for row in batch_data:
+                rows_by_key[next(iter(row['_idProps']))].append(row)
+            queries = [(f"""
+            UNWIND $batch AS row
+            MERGE (node:{label} {{{key}: row._idProps.{key}}})
+            """ + update, rows) for key, rows in rows_by_key.items()]
         
-        with self.driver.session() as session:
-            result = session.run(query, batch=batch_data)
-            summary = result.consume()
-            self.logger.info(f"Loaded {summary.counters.nodes_created} new {label} nodes, "
-                           f"updated {summary.counters.properties_set} properties")
+        nodes_created = properties_set = 0
+        with self._session() as session:
+            for query, rows in queries:
+                summary = session.run(query, batch=rows).consume()
+                nodes_created += summary.counters.nodes_created
+                properties_set += summary.counters.properties_set
+        
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Loaded %d new %s nodes, updated %d properties", nodes_created, label, properties_set)
     
     def load_relationships(self, relationships: List[Dict[str, Any]]):
         """Load relationships into Neo4j"""
         
+        # Each bucket owns a disjoint set of nodes, so workers never wait on each other's locks
+        buckets = self._partition_relationships(relationships)
+        self._run_parallel(self._load_relationship_bucket, ((str(i), bucket) for i, bucket in enumerate(buckets)))
+    
+    def _load_relationship_bucket(self, bucket_id: str, relationships: List[Dict[str, Any]]):
+        """Load one bucket of relationships, one batch per relationship type"""
+        
         # Group relationships by type
-        rels_by_type = {}
+        rels_by_type = defaultdict(list)
         for rel in relationships:
             rel_type = rel['type']
-            if rel_type not in rels_by_type:
-                rels_by_type[rel_type] = []
             rels_by_type[rel_type].append(rel)
         
-        # Load each group
         for rel_type, rel_group in rels_by_type.items():
             self._load_relationship_batch(rel_type, rel_group)
     
+    def _partition_relationships(self, relationships: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Split relationships into at most max_workers buckets with no node shared between buckets
+        
+        Relationships are grouped into connected components (union-find over their
+        endpoints) and components are assigned greedily to the least loaded bucket.
+        A single large component stays in one bucket and is written serially.
+        """
+        parent = {}
+        
+        def find(node):
+            root = node
+            while parent.setdefault(root, root) != root:
+                root = parent[root]
+            while parent[node] != root:
+                parent[node], node = root, parent[node]
+            return root
+        
+        source_nodes = []
+        for rel in relationships:
+            source = rel['source']
+            target = rel['target']
+            source_node = (source['label'], *match_key(source['label'], source['properties']))
+            target_node = (target['label'], *match_key(target['label'], target['properties']))
+            parent[find(source_node)] = find(target_node)
+            source_nodes.append(source_node)
+        
+        components = defaultdict(list)
+        for rel, source_node in zip(relationships, source_nodes):
+            components[find(source_node)].append(rel)
+        
+        buckets = [[] for _ in range(self.max_workers)]
+        for component in sorted(components.values(), key=len, reverse=True):
+            min(buckets, key=len).extend(component)
+        
+        return [bucket for bucket in buckets if bucket]
+    
     def _load_relationship_batch(self, rel_type: str, relationships: List[Dict[str, Any]]):
         """Load a batch of relationships with the same type"""
         
@@ -174,51 +364,117 @@ class Neo4jBulkLoader:
         for rel in relationships:
             source = rel['source']
             target = rel['target']
-            
-            # Determine match keys - prioritize SKU when available
-            def get_match_key(entity_data):
-                if entity_data['label'] == 'License':
-                    return 'license_sku'
-                elif 'sku' in entity_data['properties'] and entity_data['properties']['sku']:
-                    return 'sku'
-                else:
-                    return 'name'
-            
-            source_key = get_match_key(source)
-            target_key = get_match_key(target)
+            source_key, source_value = match_key(source['label'], source['properties'])
+            target_key, target_value = match_key(target['label'], target['properties'])
             
             batch_data.append({
                 'source_label': source['label'],
                 'source_key': source_key,
-                'source_value': source['properties'].get(source_key, source['properties'].get('name', '')),
+                'source_value': source_value,
                 'target_label': target['label'],
                 'target_key': target_key,
-                'target_value': target['properties'].get(target_key, target['properties'].get('name', '')),
+                'target_value': target_value,
                 'properties': rel.get('properties', {})
             })
         
-        # Create relationships
-        query = f"""
-        UNWIND $batch AS rel
-        MATCH (source) WHERE labels(source) = [rel.source_label] AND source[rel.source_key] = rel.source_value
-        MATCH (target) WHERE labels(target) = [rel.target_label] AND target[rel.target_key] = rel.target_value
-        MERGE (source)-[r:{rel_type}]->(target)
-        SET r += rel.properties
-        """
+        # Collapse duplicate (source, target) pairs extracted from several chunks; MERGE
+        # is idempotent so only the payload shrinks, and properties are combined.
+        # Every copy lands in the same bucket since buckets are split by node.
+        unique_rows = {}
+        for row in batch_data:
+            pair = (row['source_label'], row['source_key'], row['source_value'],
+                    row['target_label'], row['target_key'], row['target_value'])
+            kept = unique_rows.get(pair)
+            if kept is None:
+                unique_rows[pair] = row
+            else:
+                kept['properties'] = {**kept['properties'], **row['properties']}
         
-        with self.driver.session() as session:
-            result = session.run(query, batch=batch_data)
-            summary = result.consume()
-            self.logger.info(f"Created {summary.counters.relationships_created} {rel_type} relationships")
+        if len(unique_rows) < len(batch_data) and self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Dropped %d duplicate %s relationships", len(batch_data) - len(unique_rows), rel_type)
+        batch_data = list(unique_rows.values())
+        
+        # Group by endpoint label/key so each query uses static labels and keys,
+        # letting the planner seek the constraint/index instead of scanning all nodes
+        batches_by_pattern = defaultdict(list)
+        for row in batch_data:
+            pattern = (row['source_label'], row['source_key'], row['target_label'], row['target_key'])
+            batches_by_pattern[pattern].append(row)
+        
+        if self._apoc_available():
+            merge = "CALL apoc.merge.relationship(source, $rel_type, {}, row.properties, target, row.properties) YIELD rel"
+        elif REL_TYPE_RE.match(rel_type):
+            merge = f"MERGE (source)-[rel:{rel_type}]->(target) SET rel += row.properties"
+        else:
+            self.logger.warning(f"Skipping {len(batch_data)} relationships with invalid type {rel_type!r}")
+            return
+        
+        relationships_created = 0
+        with self._session() as session:
+            for (source_label, source_key, target_label, target_key), rows in batches_by_pattern.items():
+                if not {source_label, target_label} <= NODE_LABELS or not {source_key, target_key} <= MATCH_KEYS:
+                    self.logger.warning(f"Skipping {len(rows)} {rel_type} relationships with unknown "
+                                        f"pattern ({source_label}.{source_key})->({target_label}.{target_key})")
+                    continue
+                
+                match_and_merge = f"""
+                MATCH (source:{source_label} {{{source_key}: row.source_value}})
+                MATCH (target:{target_label} {{{target_key}: row.target_value}})
+                {merge}
+                """
+                
+                if self._supports_call_in_transactions():
+                    # Let the server commit every transaction_size rows to bound locks and memory
+                    query = f"""
+                    UNWIND $batch AS row
+                    CALL {{
+                        WITH row
+                        {match_and_merge}
+                        RETURN count(rel) AS merged
+                    }} IN TRANSACTIONS OF {self.transaction_size} ROWS
+                    RETURN sum(merged)
+                    """
+                    chunks = [rows]
+                else:
+                    # Neo4j 4.x: commit each transaction_size rows from the client instead
+                    query = f"""
+                    UNWIND $batch AS row
+                    {match_and_merge}
+                    RETURN count(*)
+                    """
+                    chunks = [rows[i:i + self.transaction_size] for i in range(0, len(rows), self.transaction_size)]
+                
+                # session.run uses an auto-commit transaction, which IN TRANSACTIONS requires
+                for chunk in chunks:
+                    result = session.run(query, batch=chunk, rel_type=rel_type)
+                    summary = result.consume()
+                    relationships_created += summary.counters.relationships_created
+        
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Created %d %s relationships", relationships_created, rel_type)
 
 class CSVExporter:
     """
     Exports extracted knowledge to CSV format for neo4j-admin import
+    
+    Files use the :ID/:LABEL and :START_ID/:END_ID/:TYPE headers, e.g.
+    neo4j-admin database import full --nodes=product_nodes.csv
+        --relationships=product_compatible_with_base_relationships.csv
+    
+    With format='parquet' the same columns are written to ZSTD-compressed
+    Parquet files instead (neo4j-admin 5.26+, requires pyarrow). With
+    compress=True CSV files are gzipped (.csv.gz), which neo4j-admin reads directly.
     """
     
-    def __init__(self, output_dir: Path):
+    FORMATS = ("csv", "parquet")
+    
+    def __init__(self, output_dir: Path, format: str = "csv", compress: bool = False):
+        if format not in self.FORMATS:
+            raise ValueError(f"Unsupported export format {format!r}, expected one of {self.FORMATS}")
         self.output_dir = output_dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.format = format
+        self.compress = compress
         self.logger = logging.getLogger(self.__class__.__name__)
     
     def export_to_csv(self, knowledge_data: List[Dict[str, Any]]):
@@ -238,70 +494,128 @@ class CSVExporter:
         # Export relationships by type
         self._export_relationships(all_relationships)
         
-        self.logger.info(f"Exported {len(all_entities)} entities and {len(all_relationships)} relationships to CSV")
+        self.logger.info(f"Exported {len(all_entities)} entities and {len(all_relationships)} relationships to {self.format}")
+    
+    def _node_id(self, props: Dict[str, Any]) -> str:
+        """Identifier used for the :ID / :START_ID / :END_ID columns"""
+        return str(props.get('sku') or props.get('license_sku') or props.get('name', ''))
+    
+    def _column_type(self, values: List[Any]) -> Optional[str]:
+        """neo4j-admin type of a property column, or None for plain strings"""
+        present = [v for v in values if v is not None and v != '']
+        if present and all(isinstance(v, bool) for v in present):
+            return "boolean"
+        if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+            return "int"
+        if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+            return "float"
+        return None
+    
+    def _typed_header(self, column: str, values: List[Any]) -> str:
+        """Add a neo4j-admin type suffix to a property column based on its values"""
+        column_type = self._column_type(values)
+        return f"{column}:{column_type}" if column_type else column
+    
+    def _write_rows(self, file_stem: str, rows: List[Dict[str, Any]], typed: bool = False) -> Path:
+        """Write rows in the configured format and return the file written"""
+        if self.format == "parquet":
+            output_file = self.output_dir / f"{file_stem}.parquet"
+            self._write_parquet(output_file, rows)
+        else:
+            output_file = self.output_dir / (f"{file_stem}.csv.gz" if self.compress else f"{file_stem}.csv")
+            self._write_csv(output_file, rows, typed=typed)
+        return output_file
+    
+    def _write_parquet(self, parquet_file: Path, rows: List[Dict[str, Any]]):
+        """Write rows to a ZSTD-compressed Parquet file with per-column types"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+        columns = {}
+        for column in fieldnames:
+            values = [row.get(column) for row in rows]
+            if self._column_type(values):
+                values = [None if v == '' else v for v in values]
+            else:
+                # Mixed or non-scalar columns are stored as strings
+                values = [None if v is None else str(v) for v in values]
+            columns[column] = values
+        
+        pq.write_table(pa.table(columns), parquet_file, compression='zstd', use_dictionary=True)
+    
+    def _write_csv(self, csv_file: Path, rows: List[Dict[str, Any]], typed: bool = False):
+        """Stream rows to a CSV file, using the ordered union of row keys as columns"""
+        fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+        header = fieldnames
+        if typed:
+            header = [
+                column if column.startswith(':') else self._typed_header(column, [row.get(column) for row in rows])
+                for column in fieldnames
+            ]
+        
+        if self.compress:
+            f = gzip.open(csv_file, 'wt', newline='', encoding='utf-8', compresslevel=3)
+        else:
+            f = open(csv_file, 'w', newline='', encoding='utf-8', buffering=1 << 20)
+        
+        with f:
+            csv.writer(f).writerow(header)
+            csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore').writerows(rows)
     
     def _export_entities(self, entities: List[Dict[str, Any]]):
-        """Export entities to CSV files"""
+        """Export entities to one node file per label in neo4j-admin import format"""
         
         # Group by label
-        entities_by_label = {}
+        entities_by_label = defaultdict(list)
         for entity in entities:
             label = entity['label']
-            if label not in entities_by_label:
-                entities_by_label[label] = []
             entities_by_label[label].append(entity)
         
         # Export each type
         for label, entity_list in entities_by_label.items():
-            # Prepare data
-            rows = []
+            # Prepare data, keeping the first node per ID since IDs must be unique within a label
+            rows_by_id = {}
             for entity in entity_list:
-                row = entity['properties'].copy()
-                row['_label'] = label
-                rows.append(row)
+                node_id = self._node_id(entity['properties'])
+                if not node_id or node_id in rows_by_id:
+                    continue
+                row = {f":ID({label})": node_id}
+                row.update(entity['properties'])
+                row[':LABEL'] = label
+                rows_by_id[node_id] = row
+            rows = list(rows_by_id.values())
             
             # Write to CSV
             if rows:
-                df = pd.DataFrame(rows)
-                csv_file = self.output_dir / f"{label.lower()}_nodes.csv"
-                df.to_csv(csv_file, index=False)
-                self.logger.info(f"Exported {len(rows)} {label} nodes to {csv_file}")
+                output_file = self._write_rows(f"{label.lower()}_nodes", rows)
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Exported %d %s nodes to %s", len(rows), label, output_file)
     
     def _export_relationships(self, relationships: List[Dict[str, Any]]):
-        """Export relationships to CSV files"""
+        """Export relationships to one file per (start label, end label, type) in neo4j-admin import format"""
         
-        # Group by type
-        rels_by_type = {}
+        # Group by start label, end label and type, since :START_ID/:END_ID name a single ID space
+        rels_by_triple = defaultdict(list)
         for rel in relationships:
-            rel_type = rel['type']
-            if rel_type not in rels_by_type:
-                rels_by_type[rel_type] = []
-            rels_by_type[rel_type].append(rel)
+            triple = (rel['source']['label'], rel['target']['label'], rel['type'])
+            rels_by_triple[triple].append(rel)
         
-        # Export each type
-        for rel_type, rel_list in rels_by_type.items():
+        # Export each triple
+        for (source_label, target_label, rel_type), rel_list in rels_by_triple.items():
             rows = []
             for rel in rel_list:
-                source = rel['source']
-                target = rel['target']
-                
-                # Determine identifiers
-                source_id = source['properties'].get('sku') or source['properties'].get('license_sku') or source['properties'].get('name', '')
-                target_id = target['properties'].get('sku') or target['properties'].get('license_sku') or target['properties'].get('name', '')
-                
                 row = {
-                    '_source_id': source_id,
-                    '_source_label': source['label'],
-                    '_target_id': target_id,
-                    '_target_label': target['label'],
-                    '_type': rel_type
+                    f":START_ID({source_label})": self._node_id(rel['source']['properties']),
+                    f":END_ID({target_label})": self._node_id(rel['target']['properties']),
+                    ':TYPE': rel_type
                 }
                 row.update(rel.get('properties', {}))
                 rows.append(row)
             
             # Write to CSV
             if rows:
-                df = pd.DataFrame(rows)
-                csv_file = self.output_dir / f"{rel_type.lower()}_relationships.csv"
-                df.to_csv(csv_file, index=False)
-                self.logger.info(f"Exported {len(rows)} {rel_type} relationships to {csv_file}")
\ No newline at end of file
+                file_stem = f"{source_label.lower()}_{rel_type.lower()}_{target_label.lower()}_relationships"
+                output_file = self._write_rows(file_stem, rows, typed=True)
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Exported %d %s relationships to %s", len(rows), rel_type, output_file)
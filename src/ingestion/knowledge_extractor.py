@@ -5,13 +5,57 @@ Uses OpenAI API to extract entities and relationships from documents
 
 import json
 import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass, asdict
-from openai import OpenAI
+from dataclasses import dataclass
+from openai import OpenAI, APIConnectionError, APIStatusError, InternalServerError, RateLimitError
+import orjson
 import re
+import threading
+
+from src.core.llm_cache import LLMCache
 
 logger = logging.getLogger(__name__)
 
+_JSON_DECODER = json.JSONDecoder()
+_PAGE_MARKER_RE = re.compile(r'--- Page \d+ ---|\bPage \d+ of \d+\b', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+# Simplex part numbers, e.g. 4098-9714 or 4100-1431A, but not year ranges such as 2019-2023
+_SKU_RE = re.compile(r'\b(?!(?:19|20)\d\d-(?:19|20)\d\d\b)\d{4}-\d{3,5}[A-Z]?\b')
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+|\n{2,}')
+_SPEC_KEY_RE = re.compile(r'[^a-z0-9]+')
+
+# Datasheet excerpt used by the worked examples in both extraction prompts
+_EXAMPLE_DATASHEET = """--- Page 1 ---
+TrueAlarm Analog Sensing Photoelectric Smoke Sensor 4098-9714
+The 4098-9714 photoelectric sensor mounts on the 4098-9792 standard sensor base. For installations that require local audible signaling, use the 4098-9794 sounder base instead.
+Sensors communicate with 4100ES and 4010ES fire alarm control panels over the IDNet addressable loop.
+Specifications: operating voltage 24 VDC nominal; standby current 300 uA; operating temperature 32 to 100 F (0 to 38 C). Listed to UL 268.
+The 4100-3109 IDNet+ module adds 246 addressable points to a 4100ES panel and draws 95 mA from the 4100-5311 power supply. Standby power is provided by 2081-9272 12 V 18 Ah sealed lead-acid batteries.
+(c) 2019-2023 Johnson Controls. All rights reserved. Page 1 of 4"""
+
+def canonicalize_text(text: str) -> str:
+    """Normalize text for duplicate detection: drop page markers, collapse whitespace, lowercase"""
+    return _WHITESPACE_RE.sub(' ', _PAGE_MARKER_RE.sub(' ', text)).strip().lower()
+
+def parse_json_object(text: str) -> Dict[str, Any]:
+    """Decode the first JSON object in an LLM response, ignoring any surrounding prose or code fences"""
+    try:
+        # Structured outputs return bare JSON, which orjson parses directly
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        pass
+    
+    start = text.find('{')
+    if start == -1:
+        raise ValueError("No JSON object found in LLM response")
+    # raw_decode scans forward once and stops at the end of the object, so there is no regex backtracking
+    obj, _ = _JSON_DECODER.raw_decode(text, start)
+    return obj
+
 @dataclass
 class Entity:
     """Represents an extracted entity"""
@@ -47,82 +91,111 @@ class KnowledgeExtractor:
         "USES_BATTERY", "POWERED_BY", "REQUIRES_MODULE", "HAS_SPECIFICATION"
     ]
     
-    def __init__(self, openai_client: OpenAI):
-        self.client = openai_client
+    ENTITY_DESCRIPTIONS = {
+        "Product": "general fire alarm products and equipment",
+        "License": "software licenses or compliance certifications",
+        "Panel": "fire alarm control panels and main units",
+        "Module": "expansion modules, interface cards, and internal components",
+        "Feature": "software features or system capabilities",
+        "Detector": "smoke detectors, heat detectors, and sensing devices",
+        "Base": "detector bases, mounting hardware, and sounder bases",
+        "Annunciator": "display panels, LED indicators, and user interfaces",
+        "PowerSupply": "power supplies, transformers, and electrical units",
+        "Battery": "backup batteries and power storage devices",
+        "Circuit": "wiring circuits, loops, and electrical connections",
+        "Accessory": "mounting brackets, tools, and auxiliary components",
+        "Specification": "technical standards, compliance requirements, and performance specs"
+    }
+    RELATIONSHIP_DESCRIPTIONS = {
+        "COMPATIBLE_WITH": "Products that can work together or are interoperable",
+        "REQUIRES_LICENSE": "Products that need specific software licenses or certifications",
+        "PART_OF": "Components that are part of larger systems or assemblies",
+        "SUPPORTS": "Products that enable or support specific features or capabilities",
+        "HAS_BASE": "Detectors that require or use specific mounting bases",
+        "HAS_MODULE": "Panels or systems that include or require specific modules",
+        "ALTERNATIVE_TO": "Products that can substitute for or replace other products",
+        "REQUIRES_POWER_SUPPLY": "Components that need specific power supplies",
+        "USES_BATTERY": "Devices that use specific types of backup batteries",
+        "POWERED_BY": "Devices that receive power from other components",
+        "REQUIRES_MODULE": "Systems that need specific modules for operation",
+        "HAS_SPECIFICATION": "Products with specific technical specifications or standards"
+    }
+    
+    # Static system messages and prompt prefixes are built once (see below the class) and
+    # always sent first, so OpenAI's automatic prompt caching can reuse them across chunks.
+    # Caching only applies past 1024 prompt tokens; the worked examples keep each prefix above that.
+    _ENTITY_SYSTEM_MESSAGE = "You are a knowledge extraction expert. Respond only with valid JSON."
+    _RELATIONSHIP_SYSTEM_MESSAGE = "You are a relationship extraction expert. Respond only with valid JSON."
+    _ENTITY_DESC_BLOCK = ""
+    _REL_DESC_BLOCK = ""
+    _ENTITY_PROMPT_PREFIX = ""
+    _REL_PROMPT_PREFIX = ""
+    # Output token budgets; completions are billed at a premium and never cached, so size them to the input
+    ENTITY_OUTPUT_TOKENS = 160  # room for specification name/value pairs
+    RELATIONSHIP_OUTPUT_TOKENS = 200
+    MIN_OUTPUT_TOKENS = 400
+    _ENTITY_RESPONSE_FORMAT: Dict[str, Any] = {}
+    _RELATIONSHIP_RESPONSE_FORMAT: Dict[str, Any] = {}
+    
+    def __init__(self, openai_client: OpenAI, cache_dir: Optional[Path] = None, cache_ttl_hours: int = 24 * 30,
+                 entity_model: str = "gpt-4o-mini", relationship_model: str = "gpt-4o", stream: bool = False,
+                 max_retries: int = 6):
+        # _call_llm owns retries and backoff; leaving the SDK's own retries on would stack both schedules
+        self.client = openai_client.with_options(max_retries=0)
+        self.stream = stream
+        self.max_retries = max_retries
+        # Entity extraction is a mechanical NER pass; the larger model is kept for relationship reasoning
+        self.entity_model = entity_model
+        self.relationship_model = relationship_model
+        # Optional response cache so re-processed chunks never hit the API twice
+        self.cache = LLMCache(cache_dir, ttl_hours=cache_ttl_hours) if cache_dir else None
         self.logger = logging.getLogger(self.__class__.__name__)
+        
+        # OpenAI prompt-cache accounting, shared across extraction threads
+        self.total_prompt_tokens = 0
+        self.cache_hit_tokens = 0
+        self._usage_lock = threading.Lock()
     
-    def _get_entity_description(self, label: str) -> str:
+    @property
+    def prompt_cache_hit_ratio(self) -> float:
+        """Fraction of prompt tokens served from OpenAI's prompt cache"""
+        return self.cache_hit_tokens / max(1, self.total_prompt_tokens)
+    
+    @classmethod
+    def _get_entity_description(cls, label: str) -> str:
         """Get description for entity type to help LLM understand what to extract"""
-        descriptions = {
-            "Product": "general fire alarm products and equipment",
-            "License": "software licenses or compliance certifications",
-            "Panel": "fire alarm control panels and main units",
-            "Module": "expansion modules, interface cards, and internal components",
-            "Feature": "software features or system capabilities",
-            "Detector": "smoke detectors, heat detectors, and sensing devices",
-            "Base": "detector bases, mounting hardware, and sounder bases",
-            "Annunciator": "display panels, LED indicators, and user interfaces",
-            "PowerSupply": "power supplies, transformers, and electrical units",
-            "Battery": "backup batteries and power storage devices",
-            "Circuit": "wiring circuits, loops, and electrical connections",
-            "Accessory": "mounting brackets, tools, and auxiliary components",
-            "Specification": "technical standards, compliance requirements, and performance specs"
-        }
-        return descriptions.get(label, "system components")
+        return cls.ENTITY_DESCRIPTIONS.get(label, "system components")
     
-    def _get_relationship_description(self, rel_type: str) -> str:
+    @classmethod
+    def _get_relationship_description(cls, rel_type: str) -> str:
         """Get description for relationship type to help LLM understand what to look for"""
-        descriptions = {
-            "COMPATIBLE_WITH": "Products that can work together or are interoperable",
-            "REQUIRES_LICENSE": "Products that need specific software licenses or certifications",
-            "PART_OF": "Components that are part of larger systems or assemblies",
-            "SUPPORTS": "Products that enable or support specific features or capabilities",
-            "HAS_BASE": "Detectors that require or use specific mounting bases",
-            "HAS_MODULE": "Panels or systems that include or require specific modules",
-            "ALTERNATIVE_TO": "Products that can substitute for or replace other products",
-            "REQUIRES_POWER_SUPPLY": "Components that need specific power supplies",
-            "USES_BATTERY": "Devices that use specific types of backup batteries",
-            "POWERED_BY": "Devices that receive power from other components",
-            "REQUIRES_MODULE": "Systems that need specific modules for operation",
-            "HAS_SPECIFICATION": "Products with specific technical specifications or standards"
-        }
-        return descriptions.get(rel_type, "related components")
-        
-    def extract_knowledge(self, text_chunk: str) -> Tuple[List[Entity], List[Relationship]]:
-        """
-        Extract entities and relationships from a text chunk using prompt chaining
-        
-        Args:
-            text_chunk: Text to extract knowledge from
-            
-        Returns:
-            Tuple of (entities, relationships)
-        """
-        # Step 1: Entity Identification
-        entities = self._extract_entities(text_chunk)
-        
-        # Step 2: Relationship Extraction
-        relationships = self._extract_relationships(text_chunk, entities)
-        
-        return entities, relationships
+        return cls.RELATIONSHIP_DESCRIPTIONS.get(rel_type, "related components")
     
-    def _extract_entities(self, text: str) -> List[Entity]:
-        """Extract entities using LLM"""
-        
-        # Limit text length for API
-        text_to_analyze = text[:2000]
-        
-        prompt = f"""You are an expert knowledge extraction specialist for fire alarm and security systems. Your task is to identify and extract structured entities from technical documentation.
+    @classmethod
+    def _build_entity_desc_block(cls) -> str:
+        """Build the bullet list describing each entity type"""
+        return "\n".join(f"• {label}: For {cls._get_entity_description(label)}" for label in cls.VALID_NODE_LABELS)
+    
+    @classmethod
+    def _build_relationship_desc_block(cls) -> str:
+        """Build the bullet list describing each relationship type"""
+        return "\n".join(f"• {rel}: {cls._get_relationship_description(rel)}" for rel in cls.VALID_RELATIONSHIPS)
+    
+    @classmethod
+    def _build_entity_prompt_prefix(cls) -> str:
+        """Build the static part of the entity extraction prompt"""
+        return """You are an expert knowledge extraction specialist for fire alarm and security systems. Your task is to identify and extract structured entities from technical documentation.
 
 ENTITY TYPES TO EXTRACT:
-{chr(10).join([f"• {label}: For {self._get_entity_description(label)}" for label in self.VALID_NODE_LABELS])}
+""" + cls._ENTITY_DESC_BLOCK + """
 
 EXTRACTION GUIDELINES:
 1. Extract only entities explicitly mentioned in the text
 2. Prioritize SKU codes, model numbers, and part numbers when available
-3. Include technical specifications (voltage, current, capacity, etc.)
+3. List technical specifications (voltage, current, capacity, etc.) under "specifications" as name/value pairs
 4. Capture compatibility and requirement information
 5. Note any regulatory compliance or standards mentioned
+6. If PRE-IDENTIFIED SKUS are listed, return an entity for each one that is a product or part number, with its correct type and properties
 
 REQUIRED PROPERTIES FOR EACH ENTITY:
 - sku: Product/model number (if available)
@@ -131,86 +204,99 @@ REQUIRED PROPERTIES FOR EACH ENTITY:
 - description: Key technical details or purpose
 - manufacturer: Brand name (if mentioned)
 
-Format your response as a valid JSON array:
-[
-  {{
-    "label": "Detector",
-    "properties": {{
-      "sku": "4098-9714",
-      "name": "TrueAlarm Photoelectric Smoke Detector",
-      "type": "photoelectric",
-      "description": "Commercial grade smoke detector with enhanced sensitivity",
-      "manufacturer": "Simplex"
-    }},
-    "source_text": "The exact text phrase where this entity was identified"
-  }}
-]
+Use null for properties that are not mentioned.
 
-TEXT TO ANALYZE:
-{text_to_analyze}
+DISAMBIGUATION RULES:
+- Year ranges (e.g. "2019-2023"), dates, page numbers and document revision codes are never SKUs
+- Use the most specific label that fits: a smoke sensor is a Detector, a sounder base is a Base; use Product only when no other label applies
+- Panel or product family names without a part number (e.g. "4100ES") are entities with sku set to null and the family name as name
+- Standards and listings such as UL 268 or NFPA 72 are Specification entities named after the standard
+- Ratings, currents, capacities and environmental limits belong in the "specifications" of the entity they describe, not in separate entities
+- Report each entity once, even if the text mentions it several times; pick the most informative mention as source_text
+- source_text is the short phrase that names the entity, copied verbatim from the text
+- Confidence is 1.0 when the text names the entity explicitly and 0.5 when it is only implied
 
-RESPOND WITH JSON ONLY:"""
+WORKED EXAMPLE
+Text:
+""" + _EXAMPLE_DATASHEET + """
 
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a knowledge extraction expert. Respond only with valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=2000
-            )
-            
-            # Parse response
-            response_text = response.choices[0].message.content
-            
-            # Extract JSON from response
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            if json_match:
-                entities_data = json.loads(json_match.group())
-                
-                entities = []
-                for entity_data in entities_data:
-                    entity = Entity(
-                        label=entity_data['label'],
-                        properties=entity_data['properties'],
-                        source_text=entity_data.get('source_text', ''),
-                        confidence=entity_data.get('confidence', 1.0)
-                    )
-                    entities.append(entity)
-                
-                self.logger.info(f"Extracted {len(entities)} entities")
-                return entities
-            else:
-                self.logger.warning("No valid JSON found in LLM response")
-                return []
-                
-        except Exception as e:
-            self.logger.error(f"Error extracting entities: {str(e)}")
-            return []
+Response:
+{
+  "entities": [
+    {
+      "label": "Detector",
+      "properties": {"sku": "4098-9714", "name": "TrueAlarm Analog Sensing Photoelectric Smoke Sensor", "type": "photoelectric", "description": "Addressable photoelectric smoke sensor for IDNet loops", "manufacturer": null},
+      "specifications": [{"name": "operating voltage", "value": "24 VDC nominal"}, {"name": "standby current", "value": "300 uA"}, {"name": "operating temperature", "value": "32 to 100 F (0 to 38 C)"}],
+      "source_text": "TrueAlarm Analog Sensing Photoelectric Smoke Sensor 4098-9714",
+      "confidence": 1.0
+    },
+    {
+      "label": "Base",
+      "properties": {"sku": "4098-9792", "name": "Standard sensor base", "type": "standard", "description": "Mounting base for TrueAlarm sensors", "manufacturer": null},
+      "specifications": [],
+      "source_text": "4098-9792 standard sensor base",
+      "confidence": 1.0
+    },
+    {
+      "label": "Base",
+      "properties": {"sku": "4098-9794", "name": "Sounder base", "type": "sounder", "description": "Sensor base with local audible signaling", "manufacturer": null},
+      "specifications": [],
+      "source_text": "4098-9794 sounder base",
+      "confidence": 1.0
+    },
+    {
+      "label": "Panel",
+      "properties": {"sku": null, "name": "4100ES", "type": "fire alarm control panel", "description": "Addressable fire alarm control panel with IDNet loops", "manufacturer": null},
+      "specifications": [],
+      "source_text": "4100ES and 4010ES fire alarm control panels",
+      "confidence": 1.0
+    },
+    {
+      "label": "Panel",
+      "properties": {"sku": null, "name": "4010ES", "type": "fire alarm control panel", "description": "Addressable fire alarm control panel with IDNet loops", "manufacturer": null},
+      "specifications": [],
+      "source_text": "4100ES and 4010ES fire alarm control panels",
+      "confidence": 1.0
+    },
+    {
+      "label": "Module",
+      "properties": {"sku": "4100-3109", "name": "IDNet+ module", "type": "addressable loop module", "description": "Adds 246 addressable points to a 4100ES panel", "manufacturer": null},
+      "specifications": [{"name": "addressable points", "value": "246"}, {"name": "current draw", "value": "95 mA"}],
+      "source_text": "The 4100-3109 IDNet+ module",
+      "confidence": 1.0
+    },
+    {
+      "label": "PowerSupply",
+      "properties": {"sku": "4100-5311", "name": "Power supply", "type": null, "description": "Supplies the 4100-3109 IDNet+ module", "manufacturer": null},
+      "specifications": [],
+      "source_text": "the 4100-5311 power supply",
+      "confidence": 1.0
+    },
+    {
+      "label": "Battery",
+      "properties": {"sku": "2081-9272", "name": "12 V 18 Ah sealed lead-acid battery", "type": "sealed lead-acid", "description": "Standby power battery", "manufacturer": null},
+      "specifications": [{"name": "voltage", "value": "12 V"}, {"name": "capacity", "value": "18 Ah"}],
+      "source_text": "2081-9272 12 V 18 Ah sealed lead-acid batteries",
+      "confidence": 1.0
+    },
+    {
+      "label": "Specification",
+      "properties": {"sku": null, "name": "UL 268", "type": "listing", "description": "Smoke detector listing standard", "manufacturer": null},
+      "specifications": [],
+      "source_text": "Listed to UL 268",
+      "confidence": 1.0
+    }
+  ]
+}
+"2019-2023" is a copyright year range, so it is not extracted."""
     
-    def _extract_relationships(self, text: str, entities: List[Entity]) -> List[Relationship]:
-        """Extract relationships between identified entities using focused relationship discovery"""
-        
-        if len(entities) < 2:
-            return []
-        
-        # Limit text length for API
-        text_to_analyze = text[:3000]  # Longer text for relationship context
-        
-        # Create entity summary for the LLM
-        entity_summary = []
-        for i, entity in enumerate(entities):
-            entity_summary.append(f"Entity {i+1}: {entity.label} - {entity.properties.get('name', 'Unknown')} (SKU: {entity.properties.get('sku', 'N/A')})")
-        
-        prompt = f"""You are an expert in fire alarm system relationships and dependencies. Analyze the text to identify explicit relationships between the entities found.
-
-IDENTIFIED ENTITIES:
-{chr(10).join(entity_summary)}
+    @classmethod
+    def _build_relationship_prompt_prefix(cls) -> str:
+        """Build the static part of the relationship extraction prompt"""
+        return """You are an expert in fire alarm system relationships and dependencies. Analyze the text to identify explicit relationships between the entities found.
 
 RELATIONSHIP TYPES TO LOOK FOR:
-{chr(10).join([f"• {rel}: {self._get_relationship_description(rel)}" for rel in self.VALID_RELATIONSHIPS])}
+""" + cls._REL_DESC_BLOCK + """
 
 RELATIONSHIP DISCOVERY GUIDELINES:
 1. Only identify relationships explicitly stated or clearly implied in the text
@@ -221,159 +307,450 @@ RELATIONSHIP DISCOVERY GUIDELINES:
 6. Extract compliance and specification relationships
 
 For each relationship found, provide:
-- Source entity (by number from list above)
-- Target entity (by number from list above)  
+- Source entity (by number from the identified entities list)
+- Target entity (by number from the identified entities list)
 - Relationship type (from valid types listed)
 - Supporting evidence from the text
 - Confidence level (0.5 for inferred, 1.0 for explicit)
 
-Format as JSON array:
-[
-  {{
-    "source_entity": 1,
-    "target_entity": 2,
-    "type": "HAS_BASE",
-    "properties": {{
-      "evidence": "The exact text that indicates this relationship",
-      "weight": 1.0,
-      "required": true
-    }},
-    "confidence": 1.0
-  }}
-]
+DIRECTION AND SELECTION RULES:
+- The source is the dependent or containing entity and the target is what it depends on or contains: a detector HAS_BASE its base, a module REQUIRES_POWER_SUPPLY its supply, a panel HAS_MODULE its module
+- Use the most specific type: prefer HAS_BASE over COMPATIBLE_WITH for a detector and its base, and REQUIRES_POWER_SUPPLY over POWERED_BY when a specific supply is named
+- ALTERNATIVE_TO links options the text presents as interchangeable ("use X instead", "or")
+- Set "required" to true for mandatory dependencies and false for optional ones or alternatives
+- "weight" is 1.0 for direct statements and 0.5 when the relationship rests on surrounding context
+- Never relate an entity to itself, and report each (source, type, target) triple only once
+- Only use entity numbers from the IDENTIFIED ENTITIES list; skip relationships whose endpoints are not listed
+
+WORKED EXAMPLE
+Identified entities:
+Entity 1: Detector - TrueAlarm Analog Sensing Photoelectric Smoke Sensor (SKU: 4098-9714)
+Entity 2: Base - Standard sensor base (SKU: 4098-9792)
+Entity 3: Base - Sounder base (SKU: 4098-9794)
+Entity 4: Panel - 4100ES (SKU: N/A)
+Entity 5: Module - IDNet+ module (SKU: 4100-3109)
+Entity 6: PowerSupply - Power supply (SKU: 4100-5311)
+Entity 7: Battery - 12 V 18 Ah sealed lead-acid battery (SKU: 2081-9272)
+Entity 8: Specification - UL 268 (SKU: N/A)
 
-TEXT TO ANALYZE:
-{text_to_analyze}
+Text:
+""" + _EXAMPLE_DATASHEET + """
 
-RESPOND WITH JSON ONLY:"""
+Response:
+{
+  "relationships": [
+    {"source_entity": 1, "target_entity": 2, "type": "HAS_BASE", "properties": {"evidence": "The 4098-9714 photoelectric sensor mounts on the 4098-9792 standard sensor base", "weight": 1.0, "required": true}, "confidence": 1.0},
+    {"source_entity": 1, "target_entity": 3, "type": "HAS_BASE", "properties": {"evidence": "For installations that require local audible signaling, use the 4098-9794 sounder base instead", "weight": 1.0, "required": false}, "confidence": 1.0},
+    {"source_entity": 3, "target_entity": 2, "type": "ALTERNATIVE_TO", "properties": {"evidence": "use the 4098-9794 sounder base instead", "weight": 1.0, "required": false}, "confidence": 1.0},
+    {"source_entity": 1, "target_entity": 4, "type": "COMPATIBLE_WITH", "properties": {"evidence": "Sensors communicate with 4100ES and 4010ES fire alarm control panels over the IDNet addressable loop", "weight": 1.0, "required": false}, "confidence": 1.0},
+    {"source_entity": 4, "target_entity": 5, "type": "HAS_MODULE", "properties": {"evidence": "The 4100-3109 IDNet+ module adds 246 addressable points to a 4100ES panel", "weight": 1.0, "required": false}, "confidence": 1.0},
+    {"source_entity": 5, "target_entity": 6, "type": "REQUIRES_POWER_SUPPLY", "properties": {"evidence": "draws 95 mA from the 4100-5311 power supply", "weight": 1.0, "required": true}, "confidence": 1.0},
+    {"source_entity": 4, "target_entity": 7, "type": "USES_BATTERY", "properties": {"evidence": "Standby power is provided by 2081-9272 12 V 18 Ah sealed lead-acid batteries", "weight": 0.5, "required": true}, "confidence": 0.5},
+    {"source_entity": 1, "target_entity": 8, "type": "HAS_SPECIFICATION", "properties": {"evidence": "Listed to UL 268", "weight": 1.0, "required": true}, "confidence": 1.0}
+  ]
+}"""
+    
+    @classmethod
+    def _build_entity_response_format(cls) -> Dict[str, Any]:
+        """Structured output schema for entity extraction"""
+        entity_properties = ["sku", "name", "type", "description", "manufacturer"]
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "entities",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "entities": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "label": {"type": "string", "enum": cls.VALID_NODE_LABELS},
+                                    "properties": {
+                                        "type": "object",
+                                        "properties": {prop: {"type": ["string", "null"]} for prop in entity_properties},
+                                        "required": entity_properties,
+                                        "additionalProperties": False
+                                    },
+                                    # Strict schemas forbid free-form keys, so specs come as name/value pairs
+                                    "specifications": {
+                                        "type": "array",
+                                        "items": {
+                                            "type": "object",
+                                            "properties": {
+                                                "name": {"type": "string"},
+                                                "value": {"type": "string"}
+                                            },
+                                            "required": ["name", "value"],
+                                            "additionalProperties": False
+                                        }
+                                    },
+                                    "source_text": {"type": "string"},
+                                    "confidence": {"type": "number"}
+                                },
+                                "required": ["label", "properties", "specifications", "source_text", "confidence"],
+                                "additionalProperties": False
+                            }
+                        }
+                    },
+                    "required": ["entities"],
+                    "additionalProperties": False
+                }
+            }
+        }
+    
+    @classmethod
+    def _build_relationship_response_format(cls) -> Dict[str, Any]:
+        """Structured output schema for relationship extraction"""
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "relationships",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "relationships": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "source_entity": {"type": "integer"},
+                                    "target_entity": {"type": "integer"},
+                                    "type": {"type": "string", "enum": cls.VALID_RELATIONSHIPS},
+                                    "properties": {
+                                        "type": "object",
+                                        "properties": {
+                                            "evidence": {"type": "string"},
+                                            "weight": {"type": "number"},
+                                            "required": {"type": "boolean"}
+                                        },
+                                        "required": ["evidence", "weight", "required"],
+                                        "additionalProperties": False
+                                    },
+                                    "confidence": {"type": "number"}
+                                },
+                                "required": ["source_entity", "target_entity", "type", "properties", "confidence"],
+                                "additionalProperties": False
+                            }
+                        }
+                    },
+                    "required": ["relationships"],
+                    "additionalProperties": False
+                }
+            }
+        }
+    
+    def _complete(self, messages: List[Dict[str, str]], model: str, temperature: float, max_tokens: int,
+                  response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run a chat completion and return its parsed JSON, serving repeated prompts from the response cache"""
+        # Key the cache on canonical text so chunks differing only in layout or page markers share a response
+        prompt = "\n".join(f"{message['role']}: {canonicalize_text(message['content'])}" for message in messages)
+        
+        if self.cache:
+            cached = self.cache.get_response(prompt, model, temperature=temperature, max_tokens=max_tokens,
+                                             response_format=response_format)
+            if cached:
+                return parse_json_object(cached.response)
+        
+        request = {
+            'model': model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens
+        }
+        if response_format:
+            request['response_format'] = response_format
+        
+        response_text, usage, finish_reason = self._call_llm(request)
+        self._log_prompt_cache_usage(usage)
         
+        # Truncated output and refusals (no content) must fail here rather than be cached and served again
+        if finish_reason != 'stop' or not response_text:
+            raise ValueError(f"Incomplete LLM response (finish_reason={finish_reason!r})")
+        response_data = parse_json_object(response_text)
+        
+        if self.cache:
+            tokens_used = usage.total_tokens if usage else 0
+            self.cache.save_response(prompt, model, response_text, tokens_used,
+                                     temperature=temperature, max_tokens=max_tokens,
+                                     response_format=response_format)
+        
+        return response_data
+    
+    def _call_llm(self, request: Dict[str, Any]) -> Tuple[Optional[str], Any, Optional[str]]:
+        """
+        Run a completion request, retrying rate limits and transient API failures with jittered backoff.
+        Returns the response text, usage and finish reason.
+        """
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                if self.stream:
+                    return self._complete_streaming(request)
+                response = self.client.chat.completions.create(**request)
+                choice = response.choices[0]
+                return choice.message.content, getattr(response, 'usage', None), choice.finish_reason
+            except (RateLimitError, APIConnectionError, InternalServerError) as e:
+                if attempt == self.max_retries:
+                    raise
+                self.logger.warning(f"Transient OpenAI error on attempt {attempt}/{self.max_retries}, retrying: {e}")
+                time.sleep(self._retry_delay(e, attempt))
+    
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Seconds to wait before the next attempt, honoring Retry-After when the API sends it"""
+        if isinstance(error, APIStatusError):
+            retry_after = error.response.headers.get('retry-after')
+            try:
+                if retry_after is not None:
+                    return min(60.0, float(retry_after))
+            except ValueError:
+                pass
+        # Exponential backoff with full jitter so concurrent workers don't retry in lockstep
+        return random.uniform(1.0, min(60.0, 2.0 ** attempt))
+    
+    def _complete_streaming(self, request: Dict[str, Any]) -> Tuple[str, Any, Optional[str]]:
+        """Stream a chat completion, returning its text, usage and finish reason; aborts early if the reply is not JSON"""
+        stream = self.client.chat.completions.create(
+            stream=True,
+            # Usage is only reported on the final chunk when explicitly requested
+            extra_body={"stream_options": {"include_usage": True}},
+            **request
+        )
+        
+        parts = []
+        usage = None
+        finish_reason = None
+        checked = False
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            if not checked and delta.strip():
+                checked = True
+                if not delta.lstrip().startswith('{'):
+                    # Stop paying for output tokens once the model answers in prose
+                    stream.response.close()
+                    raise ValueError(f"LLM response is not JSON: {delta[:50]!r}")
+        
+        return "".join(parts), usage, finish_reason
+    
+    def _log_prompt_cache_usage(self, usage):
+        """Record and log how many prompt tokens were served from OpenAI's prompt cache"""
+        if usage is None:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = (getattr(details, 'cached_tokens', 0) or 0) if details is not None else 0
+        with self._usage_lock:
+            self.total_prompt_tokens += usage.prompt_tokens
+            self.cache_hit_tokens += cached_tokens
+        self.logger.debug("Prompt cache hit: %d/%d tokens (%.1f%%)", cached_tokens, usage.prompt_tokens,
+                          100 * cached_tokens / max(1, usage.prompt_tokens))
+        
+    def extract_knowledge(self, text_chunk: str) -> Tuple[List[Entity], List[Relationship]]:
+        """
+        Extract entities and relationships from a text chunk using prompt chaining
+        
+        Args:
+            text_chunk: Text to extract knowledge from
+            
+        Returns:
+            Tuple of (entities, relationships)
+        """
+        # Step 1: Entity Identification
+        entities = self._extract_entities(text_chunk)
+        
+        # Step 2: Relationship Extraction
+        relationships = self._extract_relationships(text_chunk, entities)
+        
+        return entities, relationships
+    
+    def _extract_entities(self, text: str) -> List[Entity]:
+        """Extract entities using LLM, seeded with part numbers found by regex"""
+        
+        # Limit text length for API
+        text_to_analyze = text[:2000]
+        
+        # Part numbers are found deterministically; the LLM only has to classify them
+        skus = list(dict.fromkeys(_SKU_RE.findall(text_to_analyze)))
+        sku_hint = f"PRE-IDENTIFIED SKUS:\n{', '.join(skus)}\n\n" if skus else ""
+        
+        # Roughly one entity per 150 characters of datasheet text
+        expected_entities = max(len(skus), len(text_to_analyze) // 150)
+        max_tokens = min(2000, max(self.MIN_OUTPUT_TOKENS, self.ENTITY_OUTPUT_TOKENS * expected_entities))
+        
+        entities = []
+        llm_failed = False
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
+            response_data = self._complete(
+                model=self.entity_model,
                 messages=[
-                    {"role": "system", "content": "You are a relationship extraction expert. Respond only with valid JSON."},
-                    {"role": "user", "content": prompt}
+                    {"role": "system", "content": self._ENTITY_SYSTEM_MESSAGE},
+                    {"role": "user", "content": self._ENTITY_PROMPT_PREFIX},
+                    {"role": "user", "content": f"{sku_hint}TEXT TO ANALYZE:\n{text_to_analyze}\n\nRESPOND WITH JSON ONLY:"}
                 ],
                 temperature=0.1,
-                max_tokens=3000
+                max_tokens=max_tokens,
+                response_format=self._ENTITY_RESPONSE_FORMAT
             )
             
-            response_text = response.choices[0].message.content
+            # Structured outputs guarantee the response matches the schema
+            entities_data = response_data['entities']
+            
+            for entity_data in entities_data:
+                # Drop properties the model reported as null
+                properties = {k: v for k, v in entity_data['properties'].items() if v is not None}
+                # Flatten specifications into properties, without overriding the core fields
+                for spec in entity_data.get('specifications') or []:
+                    key = _SPEC_KEY_RE.sub('_', spec['name'].lower()).strip('_')
+                    if key and spec['value']:
+                        properties.setdefault(key, spec['value'])
+                entity = Entity(
+                    label=entity_data['label'],
+                    properties=properties,
+                    source_text=entity_data.get('source_text', ''),
+                    confidence=entity_data.get('confidence', 1.0)
+                )
+                entities.append(entity)
             
-            # Extract JSON from response
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            if json_match:
-                relationships_data = json.loads(json_match.group())
-                
-                relationships = []
-                for rel_data in relationships_data:
-                    try:
-                        source_idx = rel_data['source_entity'] - 1  # Convert to 0-based index
-                        target_idx = rel_data['target_entity'] - 1
-                        
-                        if 0 <= source_idx < len(entities) and 0 <= target_idx < len(entities):
-                            # Add weight based on confidence: 1.0 for explicit (confidence >= 0.9), 0.5 for inferred
-                            confidence = rel_data.get('confidence', 0.8)
-                            weight = 1.0 if confidence >= 0.9 else 0.5
-                            
-                            properties = rel_data.get('properties', {})
-                            properties['weight'] = weight
-                            
-                            relationship = Relationship(
-                                source=entities[source_idx],
-                                target=entities[target_idx],
-                                type=rel_data['type'],
-                                properties=properties,
-                                confidence=confidence
-                            )
-                            relationships.append(relationship)
-                    except (KeyError, IndexError, ValueError) as e:
-                        self.logger.warning(f"Skipping invalid relationship data: {e}")
-                        continue
-                
-                self.logger.info(f"Extracted {len(relationships)} relationships")
-                return relationships
-            else:
-                self.logger.warning("No valid JSON found in relationship extraction response")
-                return []
-                
         except Exception as e:
-            self.logger.error(f"Error extracting relationships: {str(e)}")
-            return []
+            self.logger.error(f"Error extracting entities: {str(e)}")
+            llm_failed = True
+        
+        # If the call failed, keep the regex part numbers as generic products; otherwise trust the LLM
+        # to have dropped any that are not real parts
+        if llm_failed:
+            entities.extend(Entity(label="Product", properties={"sku": sku}, source_text=sku, confidence=0.5)
+                            for sku in skus)
+        
+        self.logger.info(f"Extracted {len(entities)} entities")
+        return entities
     
-    def _check_relationship(self, text: str, source: Entity, target: Entity) -> Optional[Relationship]:
-        """Check if a relationship exists between two entities"""
+    def _co_occurring_entities(self, text: str, entities: List[Entity]) -> List[Entity]:
+        """Keep entities that appear in a sentence together with at least one other entity"""
+        sentences = [sentence.lower() for sentence in _SENTENCE_SPLIT_RE.split(text) if sentence.strip()]
+        
+        # Map each sentence to the entities it mentions (by source text, SKU or name)
+        sentence_entities = [set() for _ in sentences]
+        unlocated = set()
+        for idx, entity in enumerate(entities):
+            needles = {str(value).lower() for value in (entity.source_text, entity.properties.get('sku'),
+                                                       entity.properties.get('name')) if value}
+            found = False
+            for sentence_idx, sentence in enumerate(sentences):
+                if any(needle in sentence for needle in needles):
+                    sentence_entities[sentence_idx].add(idx)
+                    found = True
+            if not found:
+                # Paraphrased source text can't be located; leave the decision to the LLM
+                unlocated.add(idx)
+        
+        keep = set(unlocated)
+        for members in sentence_entities:
+            if len(members) > 1:
+                keep.update(members)
+        
+        if len(keep) < len(entities):
+            self.logger.debug(f"Kept {len(keep)}/{len(entities)} co-occurring entities for relationship extraction")
+        return [entity for idx, entity in enumerate(entities) if idx in keep]
+    
+    def _extract_relationships(self, text: str, entities: List[Entity]) -> List[Relationship]:
+        """Extract relationships between identified entities using focused relationship discovery"""
+        
+        if len(entities) < 2:
+            return []
+        
+        # Limit text length for API
+        text_to_analyze = text[:3000]  # Longer text for relationship context
+        
+        # Only entities sharing a sentence with another entity can be related
+        entities = self._co_occurring_entities(text_to_analyze, entities)
+        if len(entities) < 2:
+            return []
+        
+        # Create entity summary for the LLM
+        entity_summary = "\n".join(
+            f"Entity {i+1}: {entity.label} - {(props := entity.properties).get('name', 'Unknown')} (SKU: {props.get('sku', 'N/A')})"
+            for i, entity in enumerate(entities)
+        )
+        
+        max_tokens = min(3000, max(self.MIN_OUTPUT_TOKENS, self.RELATIONSHIP_OUTPUT_TOKENS * len(entities)))
         
-        prompt = f"""Analyze if there is a relationship between these two entities based on the text.
-
-Valid relationship types: {', '.join(self.VALID_RELATIONSHIPS)}
-
-Entity 1: {source.label} - {source.properties.get('name', source.properties.get('sku', ''))}
-Entity 2: {target.label} - {target.properties.get('name', target.properties.get('sku', ''))}
-
-Text context:
-{text[:1500]}
-
-If a relationship exists, respond with JSON:
-{{
-    "relationship_type": "COMPATIBLE_WITH",
-    "properties": {{"notes": "any relevant notes"}},
-    "source_text": "The text that indicates this relationship",
-    "confidence": 0.95
-}}
-
-If no relationship exists, respond with: {{"relationship_type": null}}
-
-Response:"""
-
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
+            response_data = self._complete(
+                model=self.relationship_model,
                 messages=[
-                    {"role": "system", "content": "You are a relationship extraction expert. Respond only with valid JSON."},
-                    {"role": "user", "content": prompt}
+                    {"role": "system", "content": self._RELATIONSHIP_SYSTEM_MESSAGE},
+                    {"role": "user", "content": self._REL_PROMPT_PREFIX},
+                    {"role": "user", "content": (
+                        f"IDENTIFIED ENTITIES:\n{entity_summary}\n\n"
+                        f"TEXT TO ANALYZE:\n{text_to_analyze}\n\nRESPOND WITH JSON ONLY:"
+                    )}
                 ],
                 temperature=0.1,
-                max_tokens=500
+                max_tokens=max_tokens,
+                response_format=self._RELATIONSHIP_RESPONSE_FORMAT
             )
             
-            response_text = response.choices[0].message.content
+            # Structured outputs guarantee the response matches the schema
+            relationships_data = response_data['relationships']
             
-            # Extract JSON
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                rel_data = json.loads(json_match.group())
-                
-                if rel_data.get('relationship_type'):
-                    # Add weight based on confidence: 1.0 for explicit (confidence >= 0.9), 0.5 for inferred
-                    confidence = rel_data.get('confidence', 1.0)
-                    weight = 1.0 if confidence >= 0.9 else 0.5
+            relationships = []
+            for rel_data in relationships_data:
+                try:
+                    source_idx = rel_data['source_entity'] - 1  # Convert to 0-based index
+                    target_idx = rel_data['target_entity'] - 1
                     
-                    properties = rel_data.get('properties', {})
-                    properties['weight'] = weight
-                    
-                    return Relationship(
-                        source_entity=source,
-                        target_entity=target,
-                        relationship_type=rel_data['relationship_type'],
-                        properties=properties,
-                        source_text=rel_data.get('source_text', ''),
-                        confidence=confidence
-                    )
-            
-            return None
+                    if 0 <= source_idx < len(entities) and 0 <= target_idx < len(entities):
+                        # Add weight based on confidence: 1.0 for explicit (confidence >= 0.9), 0.5 for inferred
+                        confidence = rel_data.get('confidence', 0.8)
+                        weight = 1.0 if confidence >= 0.9 else 0.5
+                        
+                        properties = rel_data.get('properties', {})
+                        properties['weight'] = weight
+                        
+                        relationship = Relationship(
+                            source_entity=entities[source_idx],
+                            target_entity=entities[target_idx],
+                            relationship_type=rel_data['type'],
+                            properties=properties,
+                            source_text=properties.get('evidence', ''),
+                            confidence=confidence
+                        )
+                        relationships.append(relationship)
+                except (KeyError, IndexError, ValueError) as e:
+                    self.logger.warning(f"Skipping invalid relationship data: {e}")
+                    continue
             
+            self.logger.info(f"Extracted {len(relationships)} relationships")
+            return relationships
+                
         except Exception as e:
-            self.logger.error(f"Error checking relationship: {str(e)}")
-            return None
+            self.logger.error(f"Error extracting relationships: {str(e)}")
+            return []
+
+KnowledgeExtractor._ENTITY_DESC_BLOCK = KnowledgeExtractor._build_entity_desc_block()
+KnowledgeExtractor._REL_DESC_BLOCK = KnowledgeExtractor._build_relationship_desc_block()
+KnowledgeExtractor._ENTITY_PROMPT_PREFIX = KnowledgeExtractor._build_entity_prompt_prefix()
+KnowledgeExtractor._REL_PROMPT_PREFIX = KnowledgeExtractor._build_relationship_prompt_prefix()
+KnowledgeExtractor._ENTITY_RESPONSE_FORMAT = KnowledgeExtractor._build_entity_response_format()
+KnowledgeExtractor._RELATIONSHIP_RESPONSE_FORMAT = KnowledgeExtractor._build_relationship_response_format()
 
 class DocumentProcessor:
     """
     Processes extracted documents to build knowledge graph data
     """
     
-    def __init__(self, knowledge_extractor: KnowledgeExtractor):
+    def __init__(self, knowledge_extractor: KnowledgeExtractor, max_concurrency: int = 8):
         self.extractor = knowledge_extractor
+        self.max_concurrency = max_concurrency
         self.logger = logging.getLogger(self.__class__.__name__)
     
     def process_document(self, doc_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -391,70 +768,109 @@ class DocumentProcessor:
         # Split text into chunks for processing
         chunks = self._split_text_into_chunks(text_content, chunk_size=2000)
         
+        # Skip chunks repeated within the document (boilerplate headers, footers, legal text)
+        seen = set()
+        unique_chunks = []
+        for chunk in chunks:
+            canonical = canonicalize_text(chunk)
+            if canonical and canonical not in seen:
+                seen.add(canonical)
+                unique_chunks.append(chunk)
+        
         all_entities = []
         all_relationships = []
         
-        for i, chunk in enumerate(chunks):
-            self.logger.info(f"Processing chunk {i+1}/{len(chunks)}")
-            
-            entities, relationships = self.extractor.extract_knowledge(chunk)
-            
-            all_entities.extend(entities)
-            all_relationships.extend(relationships)
+        # Chunk extractions are independent network round-trips, so overlap them
+        # (bounded by max_concurrency to stay within the API rate limits)
+        self.logger.info(f"Processing {len(unique_chunks)} chunks ({len(chunks) - len(unique_chunks)} duplicates skipped) "
+                         f"with up to {self.max_concurrency} concurrent requests")
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for entities, relationships in executor.map(self.extractor.extract_knowledge, unique_chunks):
+                all_entities.extend(entities)
+                all_relationships.extend(relationships)
+        
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Prompt cache hit ratio: %.2f%% of %d prompt tokens",
+                             100 * self.extractor.prompt_cache_hit_ratio, self.extractor.total_prompt_tokens)
         
         # Deduplicate entities
         unique_entities = self._deduplicate_entities(all_entities)
         
         return {
             "filename": doc_data.get('filename', ''),
-            "entities": [asdict(e) for e in unique_entities],
+            "entities": [self._entity_to_dict(e) for e in unique_entities],
             "relationships": [self._relationship_to_dict(r) for r in all_relationships],
             "metadata": {
-                "chunks_processed": len(chunks),
+                "chunks_processed": len(unique_chunks),
                 "total_entities": len(unique_entities),
                 "total_relationships": len(all_relationships)
             }
         }
     
-    def _split_text_into_chunks(self, text: str, chunk_size: int = 2000) -> List[str]:
-        """Split text into chunks for processing"""
-        words = text.split()
+    def process_documents(self, documents: List[Dict[str, Any]], max_documents: int = 4) -> List[Dict[str, Any]]:
+        """Process several documents concurrently, returning results in input order"""
+        # Each document fans out up to max_concurrency chunk requests, all sharing the extractor's client
+        with ThreadPoolExecutor(max_workers=max_documents) as executor:
+            return list(executor.map(self.process_document, documents))
+    
+    def _split_text_into_chunks(self, text: str, chunk_size: int = 2000, overlap: int = 200) -> List[str]:
+        """Split text into overlapping chunks, cutting at paragraph, sentence or word boundaries"""
         chunks = []
+        start = 0
+        text_length = len(text)
         
-        current_chunk = []
-        current_size = 0
-        
-        for word in words:
-            current_chunk.append(word)
-            current_size += len(word) + 1
+        while start < text_length:
+            end = min(start + chunk_size, text_length)
             
-            if current_size >= chunk_size:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = []
-                current_size = 0
-        
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
+            if end < text_length:
+                # Prefer the last paragraph break, then sentence end, then whitespace, but only in the
+                # back half of the window so every step advances well past the overlap
+                min_cut = start + max(chunk_size // 2, overlap + 1)
+                cut = text.rfind('\n\n', min_cut, end)
+                if cut < 0:
+                    cut = text.rfind('. ', min_cut, end)
+                    if cut >= 0:
+                        cut += 1
+                if cut < 0:
+                    cut = text.rfind(' ', min_cut, end)
+                if cut >= 0:
+                    end = cut
+            
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            
+            if end >= text_length:
+                break
+            # Step back for context, but always make progress
+            start = max(end - overlap, start + 1)
         
         return chunks
     
     def _deduplicate_entities(self, entities: List[Entity]) -> List[Entity]:
-        """Remove duplicate entities based on SKU or name"""
-        seen = set()
-        unique = []
+        """Remove duplicate entities based on normalized SKU or name"""
+        unique = {}
         
         for entity in entities:
-            # Create a unique key
-            key = (
-                entity.label,
-                entity.properties.get('sku') or entity.properties.get('name', '')
-            )
+            identifier = entity.properties.get('sku') or entity.properties.get('name')
+            if not identifier:
+                continue
             
-            if key not in seen and key[1]:  # Ensure we have a valid identifier
-                seen.add(key)
-                unique.append(entity)
+            # Normalize case and whitespace so "4098-9714 " and "4098-9714" collapse
+            key = (entity.label, ' '.join(str(identifier).split()).lower())
+            if key not in unique:
+                unique[key] = entity
         
-        return unique
+        return list(unique.values())
+    
+    def _entity_to_dict(self, entity: Entity) -> Dict[str, Any]:
+        """Convert entity to dictionary, sharing its properties dict instead of deep-copying it"""
+        return {
+            "label": entity.label,
+            "properties": entity.properties,
+            "source_text": entity.source_text,
+            "confidence": entity.confidence
+        }
     
     def _relationship_to_dict(self, rel: Relationship) -> Dict[str, Any]:
         """Convert relationship to dictionary"""
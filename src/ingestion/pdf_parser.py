@@ -3,159 +3,353 @@ PDF Parser Module for Simplex Product Documentation
 Handles extraction of text and tables from PDF files with advanced table extraction
 """
 
-import json
 import logging
+import multiprocessing
+import orjson
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO, StringIO
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import pandas as pd
+from boto3.s3.transfer import TransferConfig
 from dataclasses import dataclass, asdict
 import camelot
-import tabula
+import pdfplumber
 
 logger = logging.getLogger(__name__)
 
+# Keyword families used when cleaning extracted tables
+_FIRST_DROP = frozenset({'page', 'simplex', 'product', 'catalog'})
+_LAST_DROP = frozenset({'page', 'www.', 'simplex'})
+_HEADER_HINT = frozenset({'sku', 'model', 'product', 'part', 'description', 'type'})
+_KEYWORD_FAMILIES = {'first_drop': _FIRST_DROP, 'last_drop': _LAST_DROP, 'header': _HEADER_HINT}
+# Families each keyword belongs to, so one scan of a row reports every family that fired
+_WORD_FAMILIES = {
+    word: frozenset(family for family, words in _KEYWORD_FAMILIES.items() if word in words)
+    for word in frozenset().union(*_KEYWORD_FAMILIES.values())
+}
+
+def _keyword_re(words: frozenset) -> re.Pattern:
+    """Compile a case-insensitive regex matching any of the words (whole words unless they end in punctuation)"""
+    patterns = [re.escape(word) if not word[-1].isalnum() else rf'{re.escape(word)}\b' for word in sorted(words)]
+    return re.compile(r'\b(?:' + '|'.join(patterns) + ')', re.IGNORECASE)
+
+# Bump whenever extraction output changes, so cached extractions from older parsers are not reused
+_EXTRACTION_VERSION = 2
+
+# PyMuPDF is not thread-safe, so document access is serialized when PDFs are parsed concurrently
+_FITZ_LOCK = threading.Lock()
+
+# A table as (column names, rows); DataFrames are only built on demand via tables_as_df
+Table = Tuple[List[str], List[List[Any]]]
+
 @dataclass
 class ExtractedDocument:
     """Represents extracted content from a PDF document"""
     filename: str
     text_content: str
-    tables: List[pd.DataFrame]
+    tables: List[Table]
     metadata: Dict[str, Any]
     
+    @property
+    def tables_as_df(self) -> List[pd.DataFrame]:
+        """Tables wrapped as DataFrames"""
+        return [pd.DataFrame(rows, columns=columns) for columns, rows in self.tables]
+    
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for JSON serialization"""
         return {
             "filename": self.filename,
             "text_content": self.text_content,
-            "tables": [table.to_dict(orient="records") for table in self.tables],
+            "tables": [[dict(zip(columns, row)) for row in rows] for columns, rows in self.tables],
             "metadata": self.metadata
         }
+    
+    def to_json_bytes(self) -> bytes:
+        """Serialize to JSON bytes"""
+        return orjson.dumps(self.to_dict())
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExtractedDocument":
+        """Rebuild a document from its to_dict() form"""
+        tables = []
+        for records in data.get("tables", []):
+            columns = list(records[0]) if records else []
+            tables.append((columns, [[record.get(column) for column in columns] for record in records]))
+        return cls(
+            filename=data["filename"],
+            text_content=data["text_content"],
+            tables=tables,
+            metadata=data.get("metadata", {})
+        )
+
+def _init_camelot_worker():
+    """Load camelot and its backends once per worker process"""
+    import camelot  # noqa: F401
+
+def _camelot_worker_read(pdf_path: str, flavor: str, pages: str) -> List[pd.DataFrame]:
+    """Run camelot in a worker process and return the non-empty raw tables"""
+    camelot_tables = camelot.read_pdf(pdf_path, flavor=flavor, pages=pages)
+    return [table.df for table in camelot_tables if table.df is not None and not table.df.empty]
+
+class CamelotWorkerPool:
+    """
+    Persistent worker processes for camelot, so imports and Ghostscript stay warm between PDFs
+    and camelot's CPU-bound parsing runs outside the GIL of the ingestion threads
+    """
+    
+    def __init__(self, processes: Optional[int] = None):
+        self._pool = multiprocessing.Pool(processes=processes, initializer=_init_camelot_worker)
+    
+    def read_pdf(self, pdf_path: Path, flavor: str, pages: str = 'all') -> List[pd.DataFrame]:
+        """Extract raw camelot tables in a worker process"""
+        return self._pool.apply_async(_camelot_worker_read, (str(pdf_path), flavor, pages)).get()
+    
+    def close(self):
+        """Stop the worker processes"""
+        self._pool.close()
+        self._pool.join()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 class PDFParser:
     """
-    Advanced PDF parser using PyMuPDF for text and camelot/tabula for table extraction
+    Advanced PDF parser using PyMuPDF for text and camelot/pdfplumber for table extraction
     """
     
-    def __init__(self, use_advanced_tables: bool = True):
+    # A run of 3+ lines that each contain a tab or a double space; anchoring each line and testing
+    # the separator with a lookahead leaves one way to match, so the scan cannot backtrack
+    _TABLE_BLOCK_RE = re.compile(r'(?m)((?:^(?=[^\n]*(?:\t|  ))[^\n]*\n){3,})')
+    # Every keyword of every family, matched in a single scan by _keyword_families
+    _KEYWORD_RE = _keyword_re(frozenset(_WORD_FAMILIES))
+    
+    def __init__(self, use_advanced_tables: bool = True, camelot_pool: Optional[CamelotWorkerPool] = None):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.use_advanced_tables = use_advanced_tables
+        self.camelot_pool = camelot_pool
         
-    def extract_from_pdf(self, pdf_path: Path) -> ExtractedDocument:
+    def extract_from_pdf(self, pdf_path: Path, known_size: Optional[int] = None) -> ExtractedDocument:
         """
         Extract text and tables from a PDF file
         
         Args:
             pdf_path: Path to the PDF file
+            known_size: File size in bytes if already known (e.g. from an S3 listing), to skip a stat call
             
         Returns:
             ExtractedDocument containing extracted content
         """
+        file_size = known_size if known_size is not None else pdf_path.stat().st_size
+        return self._extract(pdf_path.name, file_size, pdf_path=pdf_path)
+    
+    def extract_from_bytes(self, data: bytes, filename: str) -> ExtractedDocument:
+        """
+        Extract text and tables from an in-memory PDF
+        
+        Args:
+            data: Raw PDF bytes
+            filename: Name to record for the document
+            
+        Returns:
+            ExtractedDocument containing extracted content
+        """
+        return self._extract(filename, len(data), data=data)
+    
+    def _extract(self, filename: str, file_size: int, pdf_path: Optional[Path] = None,
+                 data: Optional[bytes] = None) -> ExtractedDocument:
+        """Extract text and tables from either a file path or raw PDF bytes"""
+        source = pdf_path or filename
         try:
             import fitz  # PyMuPDF
             
-            self.logger.info(f"Processing PDF: {pdf_path}")
+            self.logger.info(f"Processing PDF: {source}")
             
-            text_content = ""
+            page_texts = []
+            page_blocks = []
             tables = []
             
-            # Extract text using PyMuPDF
-            doc = fitz.open(pdf_path)
-            try:
-                page_count = len(doc)
-                for page_num in range(page_count):
-                    page = doc[page_num]
-                    text_content += f"\n--- Page {page_num + 1} ---\n"
-                    text_content += page.get_text()
-            finally:
-                doc.close()
+            # Extract text and layout blocks in one PyMuPDF pass
+            with _FITZ_LOCK:
+                doc = fitz.open(pdf_path) if pdf_path else fitz.open(stream=data, filetype='pdf')
+                try:
+                    page_count = doc.page_count
+                    for page_num in range(page_count):
+                        # (x0, y0, x1, y1, text, block_no, block_type); type 0 is text, 1 is image
+                        blocks = [block for block in doc[page_num].get_text("blocks") if block[6] == 0]
+                        page_blocks.append(blocks)
+                        page_texts.append(f"\n--- Page {page_num + 1} ---\n" + "".join(block[4] for block in blocks))
+                finally:
+                    doc.close()
+            text_content = "".join(page_texts)
             
-            # Extract tables using advanced methods
+            # Rebuild tables from the layout already in hand, page by page; the camelot/pdfplumber
+            # passes re-parse the PDF, so they only cover the pages where that finds nothing
             if self.use_advanced_tables:
-                tables = self._extract_tables_advanced(pdf_path)
+                fallback_pages = []
+                for page_num, blocks in enumerate(page_blocks, start=1):
+                    page_tables = self._tables_from_blocks(blocks)
+                    if page_tables:
+                        tables.extend(page_tables)
+                    else:
+                        fallback_pages.append(page_num)
+                
+                if fallback_pages:
+                    fallback_text = "".join(page_texts[page - 1] for page in fallback_pages)
+                    lattice_pages = self._ruled_pages(pdf_path, data, fallback_pages)
+                    if pdf_path:
+                        tables.extend(self._extract_tables_advanced(pdf_path, fallback_text, fallback_pages,
+                                                                    lattice_pages))
+                    else:
+                        tables.extend(self._extract_tables_from_bytes(data, fallback_text, fallback_pages,
+                                                                      lattice_pages))
             else:
                 tables = self._extract_tables_simple(text_content)
             
             metadata = {
                 "page_count": page_count,
-                "file_size": pdf_path.stat().st_size,
+                "file_size": file_size,
                 "extraction_method": "PyMuPDF + Advanced Tables" if self.use_advanced_tables else "PyMuPDF",
                 "tables_found": len(tables)
             }
             
             return ExtractedDocument(
-                filename=pdf_path.name,
+                filename=filename,
                 text_content=text_content,
-                tables=tables,
+                tables=[self._to_table(df) for df in tables],
                 metadata=metadata
             )
             
         except Exception as e:
-            self.logger.error(f"Error processing PDF {pdf_path}: {str(e)}")
+            self.logger.error(f"Error processing PDF {source}: {str(e)}")
             raise
     
-    def _extract_tables_advanced(self, pdf_path: Path) -> List[pd.DataFrame]:
+    def _extract_tables_from_bytes(self, data: bytes, text_content: str, pages: List[int],
+                                   lattice_pages: List[int]) -> List[pd.DataFrame]:
+        """Run the path-based table extractors on in-memory PDF bytes, spilling to a temp file only for them"""
+        import tempfile
+        
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        try:
+            with tmp_file:
+                tmp_file.write(data)
+            return self._extract_tables_advanced(Path(tmp_file.name), text_content, pages, lattice_pages)
+        finally:
+            Path(tmp_file.name).unlink(missing_ok=True)
+    
+    def _ruled_pages(self, pdf_path: Optional[Path], data: Optional[bytes], pages: List[int]) -> List[int]:
+        """The pages (1-based) among the given ones that have ruling lines, for camelot lattice"""
+        import fitz  # PyMuPDF
+        
+        # Drawing scans are costly, so they only run on the camelot fallback path
+        with _FITZ_LOCK:
+            doc = fitz.open(pdf_path) if pdf_path else fitz.open(stream=data, filetype='pdf')
+            try:
+                return [page for page in pages if self._has_ruling_lines(doc[page - 1])]
+            finally:
+                doc.close()
+    
+    @staticmethod
+    def _has_ruling_lines(page, min_lines: int = 4, tolerance: float = 0.1) -> bool:
+        """Whether a page draws enough horizontal/vertical lines or rectangles to hold a bordered table"""
+        count = 0
+        for drawing in page.get_drawings():
+            for item in drawing['items']:
+                if item[0] == 're' or (item[0] == 'l' and (abs(item[1].x - item[2].x) < tolerance or
+                                                           abs(item[1].y - item[2].y) < tolerance)):
+                    count += 1
+                    if count >= min_lines:
+                        return True
+        return False
+    
+    def _tables_from_blocks(self, blocks: List[tuple], row_tolerance: float = 3.0,
+                            column_tolerance: float = 10.0, min_rows: int = 3) -> List[pd.DataFrame]:
         """
-        Advanced table extraction using camelot and tabula libraries
+        Reconstruct tables from one page's PyMuPDF text blocks by clustering them into rows by y-coordinate.
+        A run of at least min_rows consecutive rows whose cells (more than one) start at the same
+        x-positions, within column_tolerance, is a table.
         """
         tables = []
         
-        try:
-            # Method 1: Try camelot (lattice method for tables with clear borders)
-            self.logger.info(f"Attempting camelot lattice extraction from {pdf_path}")
-            camelot_tables = camelot.read_pdf(str(pdf_path), flavor='lattice', pages='all')
-            
-            for table in camelot_tables:
-                if table.df is not None and not table.df.empty:
-                    # Clean the table
-                    cleaned_df = self._clean_table(table.df)
-                    if cleaned_df is not None and not cleaned_df.empty:
-                        tables.append(cleaned_df)
-                        self.logger.info(f"Camelot found table with shape {cleaned_df.shape}")
-            
-        except Exception as e:
-            self.logger.warning(f"Camelot lattice extraction failed: {e}")
+        # Cluster blocks whose top edges line up into rows
+        rows = []
+        row_y = None
+        for block in sorted(blocks, key=lambda b: (b[1], b[0])):
+            if row_y is None or abs(block[1] - row_y) > row_tolerance:
+                rows.append([])
+                row_y = block[1]
+            rows[-1].append(block)
         
-        try:
-            # Method 2: Try camelot stream method (for tables without borders)  
-            self.logger.info(f"Attempting camelot stream extraction from {pdf_path}")
-            camelot_stream = camelot.read_pdf(str(pdf_path), flavor='stream', pages='all')
+        run = []
+        run_columns = []
+        for row in rows + [[]]:
+            row = sorted(row, key=lambda b: b[0])
+            cells = [' '.join(block[4].split()) for block in row]
+            columns = [block[0] for block in row]
+            if len(cells) > 1 and (not run or (len(cells) == len(run_columns) and all(
+                    abs(x - run_x) <= column_tolerance for x, run_x in zip(columns, run_columns)))):
+                run.append(cells)
+                run_columns = run_columns or columns
+                continue
             
-            for table in camelot_stream:
-                if table.df is not None and not table.df.empty:
-                    cleaned_df = self._clean_table(table.df)
-                    if cleaned_df is not None and not cleaned_df.empty and not self._is_duplicate_table(cleaned_df, tables):
-                        tables.append(cleaned_df)
-                        self.logger.info(f"Camelot stream found table with shape {cleaned_df.shape}")
-                        
-        except Exception as e:
-            self.logger.warning(f"Camelot stream extraction failed: {e}")
+            if len(run) >= min_rows:
+                cleaned_df = self._clean_table(pd.DataFrame(run[1:], columns=run[0]))
+                if cleaned_df is not None and not cleaned_df.empty:
+                    tables.append(cleaned_df)
+                    self.logger.info(f"Layout blocks produced table with shape {cleaned_df.shape}")
+            # A row with a different layout may start the next table
+            run, run_columns = ([cells], columns) if len(cells) > 1 else ([], [])
         
-        try:
-            # Method 3: Try tabula as fallback
-            self.logger.info(f"Attempting tabula extraction from {pdf_path}")
-            tabula_tables = tabula.read_pdf(str(pdf_path), pages='all', multiple_tables=True)
+        return tables
+    
+    def _extract_tables_advanced(self, pdf_path: Path, text_content: str, pages: List[int],
+                                 lattice_pages: List[int]) -> List[pd.DataFrame]:
+        """
+        Advanced table extraction using camelot and pdfplumber libraries, limited to the given pages.
+        Lattice only runs on pages with ruling lines; stream covers the remaining pages.
+        """
+        tables = []
+        fingerprints = set()
+        ruled = set(lattice_pages)
+        stream_pages = [page for page in pages if page not in ruled]
+        
+        # The extractors are independent and camelot spends most of its time in Ghostscript
+        # subprocesses, so run them side by side and merge in priority order
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            lattice = executor.submit(self._camelot_lattice, pdf_path, lattice_pages)
+            stream = executor.submit(self._camelot_stream, pdf_path, stream_pages)
+            plumber = executor.submit(self._pdfplumber, pdf_path, pages)
+            
+            # Method 1: camelot lattice (tables with clear borders)
+            for raw_df in lattice.result():
+                cleaned_df = self._clean_table(raw_df)
+                if cleaned_df is not None and not cleaned_df.empty:
+                    fingerprints.add(self._fingerprint(cleaned_df))
+                    tables.append(cleaned_df)
+                    self.logger.info(f"Camelot found table with shape {cleaned_df.shape}")
             
-            for table in tabula_tables:
-                if table is not None and not table.empty:
-                    cleaned_df = self._clean_table(table)
-                    if cleaned_df is not None and not cleaned_df.empty and not self._is_duplicate_table(cleaned_df, tables):
+            # Method 2: camelot stream (tables without borders), then Method 3: pdfplumber as fallback
+            for source, future in (("Camelot stream", stream), ("pdfplumber", plumber)):
+                for raw_df in future.result():
+                    cleaned_df = self._clean_table(raw_df)
+                    if cleaned_df is None or cleaned_df.empty:
+                        continue
+                    fingerprint = self._fingerprint(cleaned_df)
+                    if fingerprint not in fingerprints:
+                        fingerprints.add(fingerprint)
                         tables.append(cleaned_df)
-                        self.logger.info(f"Tabula found table with shape {cleaned_df.shape}")
-                        
-        except Exception as e:
-            self.logger.warning(f"Tabula extraction failed: {e}")
+                        self.logger.info(f"{source} found table with shape {cleaned_df.shape}")
         
         # If advanced methods fail, fallback to simple extraction
         if not tables:
             self.logger.info("Advanced table extraction found no tables, falling back to simple method")
-            # Read text for fallback
+            # Reuse the text already extracted by extract_from_pdf
             try:
-                import fitz
-                doc = fitz.open(pdf_path)
-                text_content = ""
-                for page_num in range(len(doc)):
-                    text_content += doc[page_num].get_text()
-                doc.close()
                 tables = self._extract_tables_simple(text_content)
             except Exception as e:
                 self.logger.error(f"Fallback simple extraction also failed: {e}")
@@ -163,6 +357,51 @@ class PDFParser:
         self.logger.info(f"Total tables extracted: {len(tables)}")
         return tables
     
+    def _camelot_lattice(self, pdf_path: Path, pages: List[int]) -> List[pd.DataFrame]:
+        """Run camelot's lattice method on the given pages, returning raw tables or [] on failure"""
+        if not pages:
+            self.logger.info(f"Skipping camelot lattice extraction, no ruled pages in {pdf_path}")
+            return []
+        try:
+            self.logger.info(f"Attempting camelot lattice extraction from {pdf_path} (pages {pages})")
+            return self._read_camelot(pdf_path, 'lattice', ','.join(map(str, pages)))
+        except Exception as e:
+            self.logger.warning(f"Camelot lattice extraction failed: {e}")
+            return []
+    
+    def _camelot_stream(self, pdf_path: Path, pages: List[int]) -> List[pd.DataFrame]:
+        """Run camelot's stream method on the given pages, returning raw tables or [] on failure"""
+        if not pages:
+            return []
+        try:
+            self.logger.info(f"Attempting camelot stream extraction from {pdf_path}")
+            return self._read_camelot(pdf_path, 'stream', ','.join(map(str, pages)))
+        except Exception as e:
+            self.logger.warning(f"Camelot stream extraction failed: {e}")
+            return []
+    
+    def _read_camelot(self, pdf_path: Path, flavor: str, pages: str = 'all') -> List[pd.DataFrame]:
+        """Run camelot in the worker pool when one is configured, otherwise in-process"""
+        if self.camelot_pool:
+            return self.camelot_pool.read_pdf(pdf_path, flavor, pages)
+        return _camelot_worker_read(str(pdf_path), flavor, pages)
+    
+    def _pdfplumber(self, pdf_path: Path, pages: List[int]) -> List[pd.DataFrame]:
+        """Run pdfplumber's table finder on the given pages, returning raw tables or [] on failure"""
+        try:
+            self.logger.info(f"Attempting pdfplumber extraction from {pdf_path}")
+            tables = []
+            with pdfplumber.open(str(pdf_path)) as pdf:
+                for page_num in pages:
+                    for raw in pdf.pages[page_num - 1].extract_tables() or []:
+                        # Use the first row as the header
+                        if raw and len(raw) > 1:
+                            tables.append(pd.DataFrame(raw[1:], columns=raw[0]))
+            return tables
+        except Exception as e:
+            self.logger.warning(f"pdfplumber extraction failed: {e}")
+            return []
+    
     def _clean_table(self, df: pd.DataFrame) -> Optional[pd.DataFrame]:
         """Clean and validate extracted table"""
         try:
@@ -173,15 +412,19 @@ class PDFParser:
             if df.shape[0] < 2 or df.shape[1] < 2:
                 return None
             
+            # The first row's keyword families serve both the banner and the header checks
+            first_row_str, first_row_cells = self._row_text(df.iloc[0])
+            first_families = self._keyword_families(first_row_str)
+            
             # Remove header/footer rows that might be page numbers or repeated headers
             if df.shape[0] > 3:
-                # Check if first/last rows contain only page numbers or common headers
-                first_row_str = ' '.join(str(df.iloc[0]).lower())
-                last_row_str = ' '.join(str(df.iloc[-1]).lower())
+                # Banner rows carry their text in a single cell; real header rows fill several columns
+                last_row_str, last_row_cells = self._row_text(df.iloc[-1])
                 
-                if any(word in first_row_str for word in ['page', 'simplex', 'product', 'catalog']):
+                if first_row_cells <= 1 and 'first_drop' in first_families:
                     df = df.iloc[1:]
-                if any(word in last_row_str for word in ['page', 'www.', 'simplex']):
+                    first_families = None
+                if last_row_cells <= 1 and 'last_drop' in self._keyword_families(last_row_str):
                     df = df.iloc[:-1]
             
             # Reset index
@@ -189,8 +432,9 @@ class PDFParser:
             
             # Set first row as header if it looks like a header
             if df.shape[0] > 1:
-                first_row = df.iloc[0].astype(str).str.lower()
-                if any(header_word in ' '.join(first_row) for header_word in ['sku', 'model', 'product', 'part', 'description', 'type']):
+                if first_families is None:
+                    first_families = self._keyword_families(self._row_text(df.iloc[0])[0])
+                if 'header' in first_families:
                     df.columns = df.iloc[0]
                     df = df.iloc[1:].reset_index(drop=True)
             
@@ -200,21 +444,32 @@ class PDFParser:
             self.logger.warning(f"Error cleaning table: {e}")
             return None
     
-    def _is_duplicate_table(self, new_table: pd.DataFrame, existing_tables: List[pd.DataFrame]) -> bool:
-        """Check if table is a duplicate of existing tables"""
+    def _to_table(self, df: pd.DataFrame) -> Table:
+        """Unwrap a DataFrame into plain column names and rows, with missing cells as None"""
+        rows = df.astype(object).where(df.notna(), None).to_numpy().tolist()
+        return [str(column) for column in df.columns], rows
+    
+    def _row_text(self, row: pd.Series) -> Tuple[str, int]:
+        """Join a row's non-empty cells into one string and count them"""
+        cells = row.dropna().astype(str).str.strip()
+        cells = cells[cells != '']
+        return cells.str.cat(sep=' '), len(cells)
+    
+    def _keyword_families(self, text: str) -> set:
+        """Names of the keyword families with at least one word in the text"""
+        return {family for match in self._KEYWORD_RE.finditer(text)
+                for family in _WORD_FAMILIES[match.group(0).lower()]}
+    
+    def _fingerprint(self, df: pd.DataFrame) -> tuple:
+        """Identify a table by its shape and first-row values, for O(1) exact duplicate checks"""
         try:
-            for existing in existing_tables:
-                # Compare shapes
-                if new_table.shape == existing.shape:
-                    # Compare content similarity (first few cells)
-                    if new_table.shape[0] > 0 and new_table.shape[1] > 0:
-                        new_sample = str(new_table.iloc[0, 0])[:50]
-                        existing_sample = str(existing.iloc[0, 0])[:50]
-                        if new_sample == existing_sample:
-                            return True
-            return False
-        except:
-            return False
+            # Cell values straight from the backing array; no per-cell str formatting or rehashing
+            first_row = tuple(df.to_numpy()[0].tolist())
+            hash(first_row)
+            return df.shape, first_row
+        except Exception:
+            # Unhashable content is never treated as a duplicate
+            return df.shape, id(df)
     
     def _extract_tables_simple(self, text: str) -> List[pd.DataFrame]:
         """
@@ -223,64 +478,67 @@ class PDFParser:
         """
         tables = []
         
-        # Look for table-like patterns in text
-        lines = text.split('\n')
-        current_table = []
-        in_table = False
-        
-        for line in lines:
-            # Simple heuristic: lines with multiple tabs or consistent spacing
-            if '\t' in line or '  ' in line:
-                if not in_table:
-                    in_table = True
-                    current_table = []
-                current_table.append(line)
-            else:
-                if in_table and len(current_table) > 2:
-                    # Try to parse as table
-                    try:
-                        df = self._parse_table_lines(current_table)
-                        if df is not None and not df.empty:
-                            tables.append(df)
-                    except:
-                        pass
-                in_table = False
-                current_table = []
+        # Simple heuristic: 3+ consecutive lines containing tabs or consistent spacing
+        for match in self._TABLE_BLOCK_RE.finditer(text + '\n'):
+            df = self._parse_table_lines(match.group(1).rstrip('\n').split('\n'))
+            if df is not None and not df.empty:
+                tables.append(df)
         
         return tables
     
     def _parse_table_lines(self, lines: List[str]) -> Optional[pd.DataFrame]:
         """Parse lines into a DataFrame"""
         try:
-            # Split by tabs or multiple spaces
-            rows = []
-            for line in lines:
-                if '\t' in line:
-                    row = line.split('\t')
-                else:
-                    row = [x.strip() for x in line.split('  ') if x.strip()]
-                if row:
-                    rows.append(row)
-            
-            if rows:
-                # Use first row as header
-                df = pd.DataFrame(rows[1:], columns=rows[0])
-                return df
-        except:
+            # Columns are separated by tabs or runs of 2+ spaces; the first row is the header
+            buffer = StringIO("\n".join(line.strip() for line in lines))
+            df = pd.read_csv(buffer, sep=r"\s{2,}|\t", engine="python", header=0,
+                             on_bad_lines="skip", dtype=str)
+            return df if not df.empty else None
+        except Exception:
             return None
-        
-        return None
 
 class S3DocumentIngester:
     """
     Handles ingestion of documents from S3 bucket
+    
+    Up to max_workers PDFs download at once, each with up to max_concurrency ranged GETs,
+    so the S3 client's connection pool should hold their product (see pool_size).
     """
     
-    def __init__(self, s3_client, bucket_name: str):
+    MAX_WORKERS = 16
+    TRANSFER_CONCURRENCY = 4
+    
+    def __init__(self, s3_client, bucket_name: str, max_workers: int = MAX_WORKERS,
+                 transfer_config: Optional[TransferConfig] = None, cache_dir: Optional[Path] = None,
+                 camelot_pool: Optional[CamelotWorkerPool] = None):
         self.s3_client = s3_client
         self.bucket_name = bucket_name
-        self.parser = PDFParser()
+        self.max_workers = max_workers
+        # Extraction results keyed by S3 key and ETag, so unchanged PDFs are not re-downloaded or re-parsed
+        self.cache_dir = cache_dir
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Large catalogs are fetched as parallel ranged GETs instead of a single stream
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=self.TRANSFER_CONCURRENCY,
+            use_threads=True
+        )
+        self.parser = PDFParser(camelot_pool=camelot_pool)
         self.logger = logging.getLogger(self.__class__.__name__)
+        
+        client_config = getattr(getattr(s3_client, 'meta', None), 'config', None)
+        pool_connections = getattr(client_config, 'max_pool_connections', None)
+        needed = self.pool_size(max_workers, self.transfer_config.max_concurrency)
+        if pool_connections is not None and pool_connections < needed:
+            self.logger.warning(f"S3 client pool has {pool_connections} connections but downloads may use "
+                                f"{needed}; set max_pool_connections={needed} to avoid waiting on the pool")
+    
+    @staticmethod
+    def pool_size(max_workers: int = MAX_WORKERS, max_concurrency: int = TRANSFER_CONCURRENCY) -> int:
+        """Connections needed for every worker's ranged GETs to run at once"""
+        return max_workers * max_concurrency
     
     def ingest_all_documents(self, prefix: str = "") -> List[ExtractedDocument]:
         """
@@ -295,24 +553,31 @@ class S3DocumentIngester:
         extracted_docs = []
         
         try:
-            # List all objects in bucket
-            response = self.s3_client.list_objects_v2(
+            # List all objects in bucket; pages beyond the first 1000 keys are fetched as needed
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            pages = paginator.paginate(
                 Bucket=self.bucket_name,
-                Prefix=prefix
+                Prefix=prefix,
+                PaginationConfig={'PageSize': 1000}
             )
             
-            if 'Contents' not in response:
-                self.logger.warning(f"No objects found in bucket {self.bucket_name}")
-                return extracted_docs
-            
-            for obj in response['Contents']:
-                if obj['Key'].lower().endswith('.pdf'):
+            # Downloads are I/O-bound, so overlap them with parsing of already-downloaded files.
+            # Keys are submitted page by page, so processing starts before the listing completes.
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {}
+                for page in pages:
+                    for obj in page.get('Contents', []):
+                        if obj['Key'].lower().endswith('.pdf'):
+                            futures[executor.submit(self._process_s3_pdf, obj['Key'])] = obj['Key']
+                
+                if not futures:
+                    self.logger.warning(f"No PDF documents found in bucket {self.bucket_name}")
+                
+                for future in as_completed(futures):
                     try:
-                        # Download and process PDF
-                        doc = self._process_s3_pdf(obj['Key'])
-                        extracted_docs.append(doc)
+                        extracted_docs.append(future.result())
                     except Exception as e:
-                        self.logger.error(f"Failed to process {obj['Key']}: {str(e)}")
+                        self.logger.error(f"Failed to process {futures[future]}: {str(e)}")
             
             self.logger.info(f"Successfully processed {len(extracted_docs)} documents")
             return extracted_docs
@@ -322,31 +587,51 @@ class S3DocumentIngester:
             raise
     
     def _process_s3_pdf(self, s3_key: str) -> ExtractedDocument:
-        """Download and process a single PDF from S3"""
-        import tempfile
+        """Download and process a single PDF from S3, reusing the cached extraction if the object is unchanged"""
+        cache_path = None
+        if self.cache_dir:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+            etag = head['ETag'].strip('"')
+            cache_path = self.cache_dir / f"{s3_key.replace('/', '_')}.{etag}.v{_EXTRACTION_VERSION}.json"
+            if cache_path.exists():
+                self.logger.info(f"Using cached extraction for {s3_key}")
+                return ExtractedDocument.from_dict(orjson.loads(cache_path.read_bytes()))
         
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=True) as tmp_file:
-            # Download from S3
-            self.logger.info(f"Downloading {s3_key} from S3")
-            self.s3_client.download_file(
-                self.bucket_name,
-                s3_key,
-                tmp_file.name
-            )
-            
-            # Parse PDF
-            doc = self.parser.extract_from_pdf(Path(tmp_file.name))
-            doc.metadata['s3_key'] = s3_key
-            
-            return doc
+        doc = self._download_and_parse(s3_key)
+        
+        if cache_path:
+            # Write to a temp file and rename so concurrent readers never see a partial file
+            tmp_path = cache_path.with_suffix('.tmp')
+            tmp_path.write_bytes(doc.to_json_bytes())
+            tmp_path.replace(cache_path)
+        
+        return doc
     
-    def save_extracted_documents(self, documents: List[ExtractedDocument], output_dir: Path):
-        """Save extracted documents to JSON files"""
-        output_dir.mkdir(parents=True, exist_ok=True)
+    def _download_and_parse(self, s3_key: str) -> ExtractedDocument:
+        """Download a PDF from S3 into memory and parse it"""
+        # Download from S3
+        self.logger.info(f"Downloading {s3_key} from S3")
+        buffer = BytesIO()
+        self.s3_client.download_fileobj(
+            self.bucket_name,
+            s3_key,
+            buffer,
+            Config=self.transfer_config
+        )
         
-        for doc in documents:
-            output_file = output_dir / f"{doc.filename}.json"
-            with open(output_file, 'w') as f:
-                json.dump(doc.to_dict(), f, indent=2)
-            
-            self.logger.info(f"Saved extracted content to {output_file}")
\ No newline at end of file
+        # Parse PDF
+        doc = self.parser.extract_from_bytes(buffer.getvalue(), Path(s3_key).name)
+        doc.metadata['s3_key'] = s3_key
+        
+        return doc
+    
+    def save_extracted_documents(self, documents: List[ExtractedDocument], output_file: Path):
+        """Save extracted documents to a single newline-delimited JSON file, one document per line"""
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        with output_file.open('wb') as f:
+            for doc in documents:
+                f.write(doc.to_json_bytes())
+                f.write(b'\n')
+        
+        self.logger.info(f"Saved {len(documents)} extracted documents to {output_file}")
\ No newline at end of file